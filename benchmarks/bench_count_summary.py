@@ -0,0 +1,72 @@
+"""Prompt tokens and modeled latency: raw last-week rows vs summary tables.
+
+    python -m benchmarks.bench_count_summary [--days 7] [--interval-seconds 30] [--trials 20]
+        [--model-base-ms 500] [--prefill-ms-per-1k 40]
+
+Renders a synthetic week of counts (one every ``interval_seconds``, a
+LiDAR-like rate) as the row-by-row ``• Time: ...`` lines the prompts used
+and as ``common.count_summary`` tables: hourly, hourly plus the profile of
+the predicted weekday, and daily. Bedrock is not called: end-to-end latency
+is modeled as build time + ``model_base_ms`` + ``prefill_ms_per_1k`` per
+thousand estimated input tokens, so only the relative difference is
+meaningful. Token counts use ``common.context_budget.estimate_tokens``.
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from common.context_budget import estimate_tokens
+from common.count_series import format_counts
+from common.count_summary import summarize_counts
+
+
+def make_week(days, interval_seconds):
+    now = datetime(2024, 12, 10, 9, 0, tzinfo=timezone.utc)
+    steps = days * 86400 // interval_seconds
+    rows = []
+    for i in range(steps, 0, -1):
+        at = now - timedelta(seconds=interval_seconds * i)
+        hour = (at.hour + 9) % 24
+        # Busy around lunch, quiet at night, with some sensor noise
+        base = 60 if 11 <= hour <= 13 else 25 if 8 <= hour <= 19 else 2
+        rows.append({"time": at.isoformat(), "num": base + (i * 7919) % 11})
+    return rows
+
+
+def run(days, interval_seconds, trials, model_base_ms, prefill_ms_per_1k):
+    rows = make_week(days, interval_seconds)
+    predicted_weekday = 1  # Tuesday, the weekday of the synthetic "now"
+    variants = [
+        ("raw rows", lambda: format_counts(rows)),
+        ("hourly", lambda: summarize_counts(rows)),
+        ("hourly+profile", lambda: summarize_counts(rows, profile_weekdays=[predicted_weekday])),
+        ("daily", lambda: summarize_counts(rows, seconds=86400)),
+    ]
+    print(f"{len(rows)} rows over {days} days")
+    print(f"{'rendering':<16} {'chars':>9} {'~tokens':>9} {'build ms':>9} {'modeled e2e ms':>15}")
+    for label, render in variants:
+        timings = []
+        for _ in range(trials):
+            start = time.perf_counter()
+            text = render()
+            timings.append((time.perf_counter() - start) * 1000)
+        build_ms = statistics.median(timings)
+        tokens = estimate_tokens(text)
+        e2e = build_ms + model_base_ms + prefill_ms_per_1k * tokens / 1000
+        print(f"{label:<16} {len(text):>9} {tokens:>9} {build_ms:>9.2f} {e2e:>15.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval-seconds", type=int, default=30)
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--model-base-ms", type=float, default=500.0, help="modeled fixed Bedrock latency")
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=40.0, help="modeled latency per 1k input tokens")
+    args = parser.parse_args(argv)
+    run(args.days, args.interval_seconds, args.trials, args.model_base_ms, args.prefill_ms_per_1k)
+
+
+if __name__ == "__main__":
+    main()
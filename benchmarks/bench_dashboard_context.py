@@ -0,0 +1,125 @@
+"""Latency of the eight chat datasets: sequential vs parallel vs one aggregate RPC.
+
+    python -m benchmarks.bench_dashboard_context [--rtt-ms 150] [--server-ms 5] [--connections 0] [--trials 10]
+
+Uses a simulated Supabase client where every round trip costs ``rtt_ms``
+and every query ``server_ms`` of database time. In aggregate mode the
+simulated server answers the aggregate RPC with ``common.dashboard_context``
+(one round trip plus the database time of all its queries); "fallback" is a
+cold container whose database lacks the RPC and pays one failed call.
+``--connections`` caps concurrent requests per client (0 = unlimited) to
+model a small connection pool, where fewer round trips matter most.
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from common import circuit_breaker, data_access, rpc_cache
+from common.dashboard_context import build_dashboard_context
+
+CHAT_DATASETS = list(data_access.DATASETS)
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Call:
+    def __init__(self, backend, function_name, params):
+        self.backend = backend
+        self.function_name = function_name
+        self.params = params
+
+    # Filters of the rolling-buffer since path; the synthetic rows ignore them
+    def gt(self, column, value):
+        return self
+
+    def order(self, column):
+        return self
+
+    def execute(self):
+        with self.backend.connections:
+            time.sleep(self.backend.rtt)
+            return _Response(self.backend.query(self.function_name, self.params))
+
+
+class SimulatedSupabase:
+    def __init__(self, rtt_ms, server_ms, rows=24, aggregate=False, connections=0):
+        self.aggregate = aggregate
+        self.connections = threading.BoundedSemaphore(connections or 1000)
+        self.rtt = rtt_ms / 1000.0
+        self.server = server_ms / 1000.0
+        self.rows = [{"time": f"2024-12-10T{h % 24:02d}:00:00+00:00", "num": h} for h in range(rows)]
+        self.round_trips = 0
+
+    def query(self, function_name, params=None):
+        if function_name == data_access.AGGREGATE_RPC_NAME:
+            if not self.aggregate:
+                raise RuntimeError(f"Could not find the function public.{function_name}")
+            return build_dashboard_context(self.query, params["datasets"])
+        time.sleep(self.server)
+        return list(self.rows)
+
+    def rpc(self, function_name, params=None):
+        self.round_trips += 1
+        return _Call(self, function_name, params)
+
+
+def _sequential(client):
+    # The handlers before the data-access layer: one RPC after another
+    return [data_access.fetch_data_from_supabase(client, data_access.DATASETS[name][0], data_access.DATASETS[name][1])
+            for name in CHAT_DATASETS]
+
+
+def _parallel(client):
+    return data_access.fetch_bundle_sync(client, CHAT_DATASETS, aggregate="")
+
+
+def _bundle(client):
+    return data_access.fetch_bundle_sync(client, CHAT_DATASETS, aggregate=data_access.AGGREGATE_RPC_NAME)
+
+
+def run(rtt_ms, server_ms, trials, connections=0):
+    modes = [
+        ("sequential", _sequential, False),
+        ("parallel", _parallel, False),
+        ("fallback", _bundle, False),
+        ("aggregate", _bundle, True),
+    ]
+    keep_alive = []
+    # Compare network paths only; the count replica would answer three datasets locally
+    data_access.COUNT_REPLICA_ENABLED = False
+    print(f"{'mode':<12} {'median ms':>10} {'p95 ms':>10} {'round trips':>12}")
+    for label, fetch, aggregate in modes:
+        timings = []
+        round_trips = 0
+        for _ in range(trials):
+            # Cold cache and a fresh rolling buffer for every trial
+            rpc_cache.RPC_CACHE.invalidate()
+            data_access._aggregate_available.clear()
+            circuit_breaker._breakers.clear()
+            client = SimulatedSupabase(rtt_ms, server_ms, aggregate=aggregate, connections=connections)
+            keep_alive.append(client)
+            start = time.perf_counter()
+            fetch(client)
+            timings.append((time.perf_counter() - start) * 1000)
+            round_trips = client.round_trips
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<12} {statistics.median(timings):>10.1f} {p95:>10.1f} {round_trips:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt-ms", type=float, default=150.0, help="simulated network round trip per RPC")
+    parser.add_argument("--server-ms", type=float, default=5.0, help="simulated database time per query")
+    parser.add_argument("--connections", type=int, default=0, help="max concurrent requests per client, 0 = unlimited")
+    parser.add_argument("--trials", type=int, default=10)
+    args = parser.parse_args(argv)
+    run(args.rtt_ms, args.server_ms, args.trials, args.connections)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Cold-start cost of eager vs lazy (intent-gated) knowledge-document loading.
+
+    python -m benchmarks.bench_lazy_knowledge [--latency-ms 80] [--trials 5]
+
+Serves synthetic schedule and solvecrowd PDFs from a local HTTP server with
+an artificial per-request latency, then measures, for each sample question,
+a cold container (empty cache dir, empty process memory) that either loads
+every document up front (the old import-time behaviour) or only the ones the
+question's intents need.
+"""
+import argparse
+import http.server
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic_pdf import make_pdf, make_text_pages
+from common import knowledge_base
+from common.knowledge_registry import KnowledgeRegistry
+
+QUESTIONS = [
+    "今日一番多かった時間は？",
+    "不審者はいましたか？",
+    "食堂の混雑対策のアドバイスをください",
+    "30分後の人数を予測してください",
+]
+
+
+def _serve(files, latency):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            body = files[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _cold_registry(base_url):
+    knowledge_base.KB_CACHE_DIR = tempfile.mkdtemp(prefix="kb_bench_")
+    knowledge_base.KB_ARTIFACT_PATH = "/nonexistent/knowledge_base.json.gz"
+    knowledge_base._memory.clear()
+    knowledge_base._artifact = None
+
+    registry = KnowledgeRegistry()
+    registry.register("schedule", f"{base_url}/schedule.pdf", ["prediction", "schedule", "crowd_advice"])
+    registry.register("solvecrowd", f"{base_url}/solvecrowd.pdf", ["crowd_advice"])
+    return registry
+
+
+def run(latency_ms, trials, schedule_pages, solvecrowd_pages):
+    files = {
+        "/schedule.pdf": make_pdf(make_text_pages(schedule_pages, prefix="Schedule")),
+        "/solvecrowd.pdf": make_pdf(make_text_pages(solvecrowd_pages, prefix="Advice")),
+    }
+    server = _serve(files, latency_ms / 1000.0)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    print(f"{'question':<40} {'eager ms':>10} {'lazy ms':>10}  loaded (lazy)")
+    for question in QUESTIONS:
+        eager, lazy = [], []
+        loaded = []
+        for _ in range(trials):
+            registry = _cold_registry(base_url)
+            start = time.perf_counter()
+            registry.load_all()
+            eager.append((time.perf_counter() - start) * 1000)
+
+            registry = _cold_registry(base_url)
+            start = time.perf_counter()
+            loaded = sorted(registry.texts_for_question(question))
+            lazy.append((time.perf_counter() - start) * 1000)
+        print(f"{question:<40} {statistics.median(eager):>10.1f} {statistics.median(lazy):>10.1f}  {', '.join(loaded) or '-'}")
+
+    server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency-ms", type=float, default=80.0, help="simulated storage latency per request")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--schedule-pages", type=int, default=10)
+    parser.add_argument("--solvecrowd-pages", type=int, default=20)
+    args = parser.parse_args(argv)
+    run(args.latency_ms, args.trials, args.schedule_pages, args.solvecrowd_pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""Prompt build time: nested f-strings vs the compiled chat template.
+
+    python -m benchmarks.bench_prompt_build [--days 7] [--interval-minutes 5] [--zones 40] [--trials 200]
+
+Builds the chat prompt from a synthetic week of data (counts every
+``interval_minutes``, hourly weather, ``zones`` zones, two knowledge
+documents) the way the handlers did before (every section formatted with
+list comprehensions and the whole prompt re-created as one f-string) and
+with ``common.chat_prompt``. Both builders must produce the same prompt.
+"budgeted" is the template with the sections fitted into
+``PROMPT_TOKEN_BUDGET``, as the handlers call it.
+The first template build (cold container) is reported separately.
+"""
+import argparse
+import contextlib
+import functools
+import io
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.synthetic_pdf import make_text_pages
+from common import chat_prompt
+from common.context_budget import PROMPT_TOKEN_BUDGET, estimate_tokens
+from common.retrieval import retrieve_relevant_text
+from common.tabular import encode_counts
+
+QUESTION = "食堂の混雑状況と明日の予測を教えてください"
+
+
+def legacy_prompt(question, suspicious_data, start_last_times, max_min_data, interval_data, weather_data, zone_data, pdf_text, current_data, last_week_data, pdf_text2, data_note=""):
+    # get_answer_from_claude before the template engine: every section formatted on every call
+    context_current = "\n不審者:\n" + encode_counts(current_data)
+
+    last_week_data = "\n不審者:\n" + encode_counts(last_week_data)
+
+    context_suspicious = "\n不審者:\n" + "\n".join([f"• Time: {entry['event_time']} - Number of People: {entry['num']}" for entry in suspicious_data or []])
+
+    context_project = "\n入り帰りデータ:\n" + "\n".join([f"•入り時間: {entry['start_time']}, 帰り時間: {entry['last_time']}" for entry in start_last_times or []])
+
+    context_maxmin = "\n:\n" + "\n".join([f"• 一番多い人: {entry.get('max_num', 'N/A')} at {entry.get('max_time', 'N/A')}\n"
+                                         f"• 一番少ない人: {entry.get('min_num', 'N/A')} at {entry.get('min_time', 'N/A')}" for entry in max_min_data or []])
+    context_interval = "\n人流データ:\n" + encode_counts(interval_data)
+
+    context_weather = "\n気候データ:\n" + chat_prompt.format_weather(weather_data)
+
+    context_zone = "\n気候データ:\n" + chat_prompt.format_zones(zone_data)
+
+    context_pdf = "\nPDF Data:\n" + retrieve_relevant_text(question, pdf_text)
+
+    context_pdf2 = "\nPDF Data:\n" + retrieve_relevant_text(question, pdf_text2)
+
+    prompt = f"""あなたは建物の利用状況を分析するアシスタントです。以下のデータを基に、ユーザーの質問に正確に答えてください。
+        注意点は予測と関係ある質問のみcontext_interval、context_weather、context_zone、context_pdf, last_week_data ,context_currentのデータを使ってください。
+        食堂混雑についてアドバイスするためにcontext_pdf2データを利用しください。
+
+利用可能なデータ:
+{data_note}
+{context_suspicious}
+{context_project}
+{context_maxmin}
+{context_interval}
+{context_weather}
+{context_zone}
+{context_pdf}
+{context_current}
+{last_week_data}
+{context_pdf2}
+
+
+回答の指針:
+0. 全ての時刻は日本の時刻です。日本のカレンダーから曜日を表示。
+1. 時刻は常にYYYY/MM/DD (曜日) HH:MM」形式で表示し　、ISO 8601形式（例: yyyy-mm-ddThh:mm:ss+00:00）は絶対に使用しない。
+2. 人数を示す際は必ず「XX人」という形式で表示
+3. 入り帰り時間帯について触れる際は、入り・帰り時刻を含める
+4. 複数の時間帯を比較する場合は、わかりやすく整理して表示
+5. データが存在しない場合は、その旨を明確に伝える
+6.「XX月XX日の人数が最も多かった時間は、YYYY/MM/DD (曜日) HH:MMでXX人でした。」
+7.「XX月XX日の人数が最も少なかった時間は、YYYY/MM/DD (曜日) HH:MMでXX人でした。」
+8. 予想データを聞くとき時間、人数、理由をちゃんと答える。
+
+特定の応答要件:
+- 入り帰り時間帯に関する質問: 入り帰り時間帯から具体的な開始・終了時刻を参照
+- 統計的な質問: 集計データを使用して最小・最大値を正確に提供
+- 常に専門的で分析的な口調を維持
+- 必要に応じて回答に関連する文脈を提供
+
+以下の質問に基づいて回答してください: {question}
+
+Please provide a clear, concise answer based on the available data:"""
+    return prompt
+
+
+def make_dataset(days, interval_minutes, zones):
+    now = datetime(2024, 12, 10, 9, 0, tzinfo=timezone.utc)
+    steps = days * 24 * 60 // interval_minutes
+    counts = [{"time": (now - timedelta(minutes=interval_minutes * i)).isoformat(), "num": (i * 7) % 90}
+              for i in range(steps, 0, -1)]
+    weather = [{"weather_time": (now + timedelta(hours=h)).isoformat(), "temperature_2m_celsius": 8.5,
+                "relative_humidity_2m_percent": 60, "apparent_temperature_celsius": 6.1, "precipitation_mm": 0.0,
+                "snowfall_cm": 0.0, "weather_code_wmo_code": 3, "cloud_cover_percent": 75, "wind_speed_10m_kmh": 9.4}
+               for h in range(days * 24)]
+    zone_rows = [{"zone_id": z, "zone_no": z, "zone_name": f"3F zone {z}",
+                  "geometry": f"POLYGON(({z} 0, {z + 1} 0, {z + 1} 1, {z} 1, {z} 0))",
+                  "count_type": "area", "capacity": 20 + z} for z in range(zones)]
+    return dict(
+        suspicious_data=[{"event_time": row["time"], "num": 1} for row in counts[::97]],
+        start_last_times=[{"start_time": f"2024-12-0{d + 1}T08:30:00+09:00", "last_time": f"2024-12-0{d + 1}T21:10:00+09:00"}
+                          for d in range(days)],
+        max_min_data=[{"max_num": 89, "max_time": counts[-1]["time"], "min_num": 0, "min_time": counts[0]["time"]}],
+        interval_data=counts[-24 * 60 // interval_minutes:],
+        weather_data=weather,
+        zone_data=zone_rows,
+        pdf_text="\n\n".join(make_text_pages(40, prefix="Schedule")),
+        current_data=counts[-1:],
+        last_week_data=counts,
+        pdf_text2="\n\n".join(make_text_pages(10, prefix="Advice")),
+        data_note="",
+    )
+
+
+def _time(build, data, trials):
+    timings = []
+    for _ in range(trials):
+        start = time.perf_counter()
+        build(QUESTION, **data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def run(days, interval_minutes, zones, trials):
+    # Compare like for like: the f-string builder sent the last week row by row
+    chat_prompt.LAST_WEEK_RAW_ROWS = True
+    data = make_dataset(days, interval_minutes, zones)
+    # Index the documents once, as a warm container has
+    retrieve_relevant_text(QUESTION, data["pdf_text"])
+    retrieve_relevant_text(QUESTION, data["pdf_text2"])
+
+    start = time.perf_counter()
+    prompt = chat_prompt.build_chat_prompt(QUESTION, token_budget=None, **data)
+    cold_ms = (time.perf_counter() - start) * 1000
+    if prompt != legacy_prompt(QUESTION, **data):
+        raise SystemExit("template prompt differs from the f-string prompt")
+
+    legacy = _time(legacy_prompt, data, trials)
+    compiled = _time(functools.partial(chat_prompt.build_chat_prompt, token_budget=None), data, trials)
+    # The budgeted builder logs which sections it summarized on every call
+    with contextlib.redirect_stdout(io.StringIO()):
+        budgeted = _time(chat_prompt.build_chat_prompt, data, trials)
+    fitted = chat_prompt.build_chat_prompt(QUESTION, **data)
+    print(f"{len(data['last_week_data'])} count rows, {len(data['weather_data'])} weather rows, "
+          f"{zones} zones, prompt {len(prompt)} chars")
+    print(f"{'builder':<12} {'median ms':>10} {'p95 ms':>10}")
+    for label, timings in (("f-string", legacy), ("template", compiled), ("budgeted", budgeted)):
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"{label:<12} {statistics.median(timings):>10.2f} {p95:>10.2f}")
+    print(f"budgeted prompt: {len(fitted)} chars, ~{estimate_tokens(fitted)} tokens "
+          f"(budget {PROMPT_TOKEN_BUDGET}, full ~{estimate_tokens(prompt)})")
+    print(f"template, first build: {cold_ms:.2f} ms; static memo {chat_prompt.CHAT_PROMPT.memo_stats()}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--interval-minutes", type=int, default=5)
+    parser.add_argument("--zones", type=int, default=40)
+    parser.add_argument("--trials", type=int, default=200)
+    args = parser.parse_args(argv)
+    run(args.days, args.interval_minutes, args.zones, args.trials)
+
+
+if __name__ == "__main__":
+    main()
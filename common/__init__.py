@@ -0,0 +1,5 @@
+"""Shared helpers for the minohc LiDAR Lambda handlers.
+
+Bundle this package next to the handler file (or ship it as a Lambda layer)
+so that ``from common... import ...`` resolves at runtime.
+"""
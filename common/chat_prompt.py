@@ -0,0 +1,134 @@
+"""The chat prompt shared by the building-usage Q&A handlers.
+
+``CHAT_PROMPT`` is compiled once per container. The guideline block, the
+weather forecast and the zone summary are static: they are pre-joined with the
+surrounding template text and reused while they are unchanged, so a request
+only formats its count and document sections. Zones are sent as area,
+centroid and adjacency (``common.zone_summary``), not raw polygons. The last week of counts is
+sent as an hourly table, and the data sections are fitted into
+``PROMPT_TOKEN_BUDGET`` by ``common.context_budget``, summarizing the
+lowest-priority ones first.
+"""
+import os
+
+from common.context_budget import (PROMPT_TOKEN_BUDGET, ContextSection, assemble, count_levels, document_levels,
+                                   estimate_tokens, weather_levels, with_header, zone_levels)
+from common.prompt_template import PromptTemplate, static_section
+from common.tabular import WEATHER_COLUMNS, encode_table
+from common.zone_summary import format_zone_summary
+
+CHAT_PROMPT = PromptTemplate("""あなたは建物の利用状況を分析するアシスタントです。以下のデータを基に、ユーザーの質問に正確に答えてください。
+        注意点は予測と関係ある質問のみcontext_interval、context_weather、context_zone、context_pdf, last_week_data ,context_currentのデータを使ってください。
+        食堂混雑についてアドバイスするためにcontext_pdf2データを利用しください。
+
+利用可能なデータ:
+{data_note}
+{context_suspicious}
+{context_project}
+{context_maxmin}
+{context_interval}
+{context_weather}
+{context_zone}
+{context_pdf}
+{context_current}
+{last_week_data}
+{context_pdf2}
+
+
+回答の指針:
+0. 全ての時刻は日本の時刻です。日本のカレンダーから曜日を表示。
+1. 時刻は常にYYYY/MM/DD (曜日) HH:MM」形式で表示し　、ISO 8601形式（例: yyyy-mm-ddThh:mm:ss+00:00）は絶対に使用しない。
+2. 人数を示す際は必ず「XX人」という形式で表示
+3. 入り帰り時間帯について触れる際は、入り・帰り時刻を含める
+4. 複数の時間帯を比較する場合は、わかりやすく整理して表示
+5. データが存在しない場合は、その旨を明確に伝える
+6.「XX月XX日の人数が最も多かった時間は、YYYY/MM/DD (曜日) HH:MMでXX人でした。」
+7.「XX月XX日の人数が最も少なかった時間は、YYYY/MM/DD (曜日) HH:MMでXX人でした。」
+8. 予想データを聞くとき時間、人数、理由をちゃんと答える。
+
+特定の応答要件:
+- 入り帰り時間帯に関する質問: 入り帰り時間帯から具体的な開始・終了時刻を参照
+- 統計的な質問: 集計データを使用して最小・最大値を正確に提供
+- 常に専門的で分析的な口調を維持
+- 必要に応じて回答に関連する文脈を提供
+
+以下の質問に基づいて回答してください: {question}
+
+Please provide a clear, concise answer based on the available data:""", static=("context_weather", "context_zone"))
+CHAT_PROMPT_TOKENS = estimate_tokens(CHAT_PROMPT.literal)
+
+# The last week is sent as an hourly table (common.count_summary) unless set
+LAST_WEEK_RAW_ROWS = os.getenv("LAST_WEEK_RAW_ROWS", "0") == "1"
+
+
+def format_suspicious(rows):
+    return "\n".join([f"• Time: {entry['event_time']} - Number of People: {entry['num']}" for entry in rows or []])
+
+
+def format_project_times(rows):
+    return "\n".join([f"•入り時間: {entry['start_time']}, 帰り時間: {entry['last_time']}" for entry in rows or []])
+
+
+def format_max_min(rows):
+    return "\n".join([f"• 一番多い人: {entry.get('max_num', 'N/A')} at {entry.get('max_time', 'N/A')}\n"
+                      f"• 一番少ない人: {entry.get('min_num', 'N/A')} at {entry.get('min_time', 'N/A')}" for entry in rows or []])
+
+
+def format_weather(rows):
+    return encode_table(rows or [], WEATHER_COLUMNS)
+
+
+def format_zones(rows):
+    return format_zone_summary(rows)
+
+
+def _chat_sections(question, interval_data, weather_data, zone_data, pdf_text, current_data, last_week_data, pdf_text2):
+    weather_header = zone_header = "\n気候データ:\n"
+    weather = with_header(weather_header, weather_levels(weather_data or [], format_weather))
+    zones = with_header(zone_header, zone_levels(zone_data or [], format_zones))
+    # Weather (15 min) and zones (daily) are cached upstream; their full text
+    # is rendered once per distinct set of rows
+    weather[0] = lambda: static_section("weather", weather_data or [], lambda rows: weather_header + format_weather(rows))
+    zones[0] = lambda: static_section("zones", zone_data or [], lambda rows: zone_header + format_zones(rows))
+    return [
+        ContextSection("current", with_header("\n不審者:\n", count_levels(current_data))),
+        ContextSection("interval", with_header("\n人流データ:\n", count_levels(interval_data))),
+        ContextSection("last_week", with_header("\n不審者:\n", count_levels(last_week_data, include_rows=LAST_WEEK_RAW_ROWS))),
+        ContextSection("weather", weather),
+        ContextSection("zones", zones),
+        ContextSection("pdf", with_header("\nPDF Data:\n", document_levels(question, pdf_text))),
+        ContextSection("pdf2", with_header("\nPDF Data:\n", document_levels(question, pdf_text2))),
+    ]
+
+
+def build_chat_prompt(question, suspicious_data, start_last_times, max_min_data, interval_data, weather_data, zone_data, pdf_text, current_data, last_week_data, pdf_text2, data_note="", token_budget=PROMPT_TOKEN_BUDGET):
+    """The chat prompt, with the data sections fitted into ``token_budget``.
+
+    ``token_budget=None`` renders every section in full.
+    """
+    fixed = dict(
+        question=question,
+        data_note=data_note,
+        context_suspicious="\n不審者:\n" + format_suspicious(suspicious_data),
+        context_project="\n入り帰りデータ:\n" + format_project_times(start_last_times),
+        context_maxmin="\n:\n" + format_max_min(max_min_data),
+    )
+    sections = _chat_sections(question, interval_data, weather_data, zone_data, pdf_text, current_data, last_week_data, pdf_text2)
+    if token_budget is None:
+        texts = {section.name: section.text(0) for section in sections}
+    else:
+        reserved = CHAT_PROMPT_TOKENS + sum(estimate_tokens(text) for text in fixed.values())
+        context = assemble(sections, token_budget, reserved)
+        if any(level != 0 for level in context.levels.values()):
+            print(f"Prompt context fitted to {context.tokens}/{token_budget} tokens: {context.summary()}")
+        texts = context.texts
+    return CHAT_PROMPT.render(
+        context_interval=texts["interval"],
+        context_weather=texts["weather"],
+        context_zone=texts["zones"],
+        context_pdf=texts["pdf"],
+        context_current=texts["current"],
+        last_week_data=texts["last_week"],
+        context_pdf2=texts["pdf2"],
+        **fixed,
+    )
@@ -0,0 +1,100 @@
+"""Per-data-source circuit breakers.
+
+After ``failure_threshold`` consecutive failures a source's breaker opens
+and calls to it are skipped for ``reset_seconds``, so a down RPC costs
+nothing instead of a timeout on every question. After that one trial call
+is let through (half-open): success closes the breaker, failure opens it
+again.
+"""
+import threading
+import time
+
+FAILURE_THRESHOLD = 3
+RESET_SECONDS = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a source whose breaker is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, name, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self.last_error = None
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """True if a call may go through now."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and self._clock() - self._opened_at < self.reset_seconds:
+                return False
+            # Half-open: let exactly one trial call through
+            if self._trial_in_flight:
+                return False
+            self._state = HALF_OPEN
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+            self.last_error = None
+
+    def record_failure(self, error=None):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            self.last_error = str(error) if error is not None else None
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    print(f"Circuit for {self.name} opened after {self._failures} failures")
+                self._state = OPEN
+                self._opened_at = self._clock()
+
+    def snapshot(self):
+        state = self.state
+        with self._lock:
+            return {"state": state, "failures": self._failures, "last_error": self.last_error}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def breaker_states(names=None):
+    """{name: snapshot} for ``names`` (default: every breaker created so far)."""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    names = breakers if names is None else names
+    return {name: breakers[name].snapshot() if name in breakers else {"state": CLOSED, "failures": 0, "last_error": None}
+            for name in names}
@@ -0,0 +1,207 @@
+"""Fit prompt context sections into an input-token budget.
+
+Each ``ContextSection`` has summarization levels ordered from most to least
+detailed (full rows, hourly and daily tables from ``common.count_summary``,
+one line of statistics...).
+``assemble`` first gives every section its smallest level, in priority order,
+then upgrades the sections in priority order to the most detailed level that
+still fits. A section is only dropped when not even its smallest level fits,
+so big weeks degrade to summaries instead of being cut off mid-row, and the
+prompt size (and Bedrock latency) stays bounded.
+
+Token counts are estimated, not exact: CJK and other non-ASCII characters
+count as about one token each, and other text as one token per three
+characters, which errs on the high side for the number-heavy data rows.
+"""
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+
+from common.count_series import CountSeries
+from common.count_summary import summary_table
+from common.retrieval import retrieve_relevant_text
+from common.tabular import encode_counts, encode_table
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+
+# Section priorities, highest first
+PRIORITY = ["current", "interval", "last_week", "weather", "zone", "pdf"]
+
+
+def estimate_tokens(text):
+    if not text:
+        return 0
+    # Most non-ASCII characters here (kana, kanji, •) are 3 bytes in UTF-8
+    wide = (len(text.encode("utf-8")) - len(text)) // 2
+    return wide + (len(text) - wide + 2) // 3
+
+
+class ContextSection:
+    """A named section whose ``levels`` are texts or zero-argument callables.
+
+    Callables are rendered only when the assembler considers that level.
+    """
+
+    def __init__(self, name, levels, priority=None):
+        self.name = name
+        self.levels = [level for level in levels if level is not None]
+        self.priority = priority if priority is not None else _priority_of(name)
+        self._rendered = {}
+
+    def text(self, level):
+        if level not in self._rendered:
+            value = self.levels[level]
+            self._rendered[level] = value() if callable(value) else value
+        return self._rendered[level]
+
+    def tokens(self, level):
+        return estimate_tokens(self.text(level))
+
+
+def _priority_of(name):
+    for i, prefix in enumerate(PRIORITY):
+        if name.startswith(prefix):
+            return i
+    # Other data sections (suspicious events, entry times...) rank ahead of documents
+    return PRIORITY.index("pdf") - 0.5
+
+
+@dataclass
+class AssembledContext:
+    texts: Dict[str, str] = field(default_factory=dict)
+    # section -> chosen level (0 = full detail), None when dropped
+    levels: Dict[str, Optional[int]] = field(default_factory=dict)
+    tokens: int = 0
+    budget: int = 0
+
+    def summary(self):
+        return ", ".join(f"{name}={'dropped' if level is None else level}" for name, level in self.levels.items())
+
+
+def assemble(sections, budget=PROMPT_TOKEN_BUDGET, reserved=0):
+    """Choose a level for every section so the total stays within ``budget``.
+
+    ``reserved`` is the estimated size of the fixed part of the prompt
+    (instructions, question), which is taken off the budget first.
+    """
+    ordered = sorted(sections, key=lambda section: section.priority)
+    remaining = budget - reserved
+    chosen = {}
+
+    full = sum(section.tokens(0) for section in ordered if section.levels)
+    if full <= remaining:
+        # Common case: everything fits in full, no summaries are rendered
+        chosen = {section.name: 0 for section in ordered if section.levels}
+        remaining -= full
+        ordered = []
+
+    # Every section gets its smallest level first, so low-priority sections
+    # are summarized rather than starved by detailed high-priority ones
+    for section in ordered:
+        if not section.levels:
+            continue
+        smallest = len(section.levels) - 1
+        cost = section.tokens(smallest)
+        if cost <= remaining:
+            chosen[section.name] = smallest
+            remaining -= cost
+
+    for section in ordered:
+        current = chosen.get(section.name)
+        if current is None:
+            continue
+        freed = section.tokens(current)
+        for level in range(current):
+            cost = section.tokens(level)
+            if cost <= remaining + freed:
+                chosen[section.name] = level
+                remaining += freed - cost
+                break
+
+    result = AssembledContext(budget=budget)
+    for section in sections:
+        level = chosen.get(section.name)
+        result.levels[section.name] = level
+        result.texts[section.name] = section.text(level) if level is not None else ""
+    result.tokens = budget - remaining
+    return result
+
+
+# Level builders for the common section types
+
+def with_header(header, levels):
+    """Prefix every level with ``header``, keeping callables lazy."""
+    return [(lambda level=level: header + (level() if callable(level) else level)) for level in levels]
+
+
+def _stats_line(series, label):
+    return (f"• {len(series)}件 {np.datetime_as_string(series.times[0], unit='m')}〜"
+            f"{np.datetime_as_string(series.times[-1], unit='m')} UTC: {label} 最小 {series.min()}人, "
+            f"平均 {series.mean():.1f}人, 最大 {series.max()}人, 最新 {int(series.counts[-1])}人")
+
+
+def count_levels(rows, label="Number of People", value_key="num", time_key="time", include_rows=True):
+    """Rows (runs of one count collapsed), JST tables of hourly, 3-hourly and
+    daily statistics, then one line.
+
+    ``include_rows=False`` starts at the hourly table.
+    """
+    if not rows:
+        return [""]
+    series = None
+
+    def get_series():
+        nonlocal series
+        if series is None:
+            series = CountSeries.from_rows(rows, time_key, value_key)
+        return series
+
+    levels = [lambda: encode_counts(rows, time_key, value_key)] if include_rows else []
+    levels += [(lambda seconds=seconds: summary_table(get_series(), seconds)) for seconds in (3600, 3 * 3600, 86400)]
+    levels.append(lambda: "(要約)\n" + _stats_line(get_series(), label))
+    return levels
+
+
+def weather_levels(rows, format_rows):
+    """``format_rows`` of all rows, every 3rd hour, every 12th hour."""
+    if not rows:
+        return [""]
+    return [
+        lambda: format_rows(rows),
+        lambda: "(3時間ごと)\n" + format_rows(rows[::3]),
+        lambda: "(12時間ごと)\n" + format_rows(rows[::12]),
+    ]
+
+
+def zone_levels(rows, format_rows):
+    """``format_rows`` of every zone, then number, name and capacity only."""
+    if not rows:
+        return [""]
+    return [
+        lambda: format_rows(rows),
+        lambda: encode_table(rows, ["zone_no", "zone_name", "capacity"]),
+        f"• {len(rows)} zones",
+    ]
+
+
+def document_levels(question, text, top_k=3):
+    """The ``top_k`` .. 1 retrieved chunks most relevant to ``question``."""
+    if not text:
+        return [""]
+    return [(lambda k=k: retrieve_relevant_text(question, text, top_k=k)) for k in range(top_k, 0, -1)]
+
+
+def list_levels(rows, encode=encode_table, steps=(None, 20, 5)):
+    """``encode`` of all rows, then of the newest ``steps`` rows, then a count."""
+    if not isinstance(rows, list):
+        return [str(rows)]
+    levels = []
+    for step in steps:
+        if step is None:
+            levels.append(lambda: encode(rows))
+        elif len(rows) > step:
+            levels.append(lambda step=step: f"(最新{step}件 / 全{len(rows)}件) " + encode(rows[-step:]))
+    levels.append(f"({len(rows)}件)")
+    return levels
@@ -0,0 +1,167 @@
+"""Embedded SQLite replica of the recent people-count history.
+
+The replica lives in ``/tmp`` so it survives warm invocations. It is seeded
+from ``get_last_week_data`` and then synced incrementally with the same
+PostgREST "since" filter as ``common.rolling_buffer``. The simple aggregate
+questions are answered from it with indexed queries instead of RPCs:
+
+* ``get_max_min_data``: busiest and quietest time of the JST day
+* ``get_start_time_and_last_time``: first and last time anyone was counted
+* ``get_find_suspicious``: people counted during night hours (22:00-06:00 JST)
+
+Rows of several zones at the same time are summed. The answers keep the
+RPCs' row shapes, so the handlers format them unchanged. The RPCs' SQL is
+not in this repo, so these meanings are inferred; ``common.data_access``
+only uses the replica when ``COUNT_REPLICA_ENABLED=1``.
+"""
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common.count_series import CountSeries
+from common.rolling_buffer import parse_time
+from common.schedule import JST
+
+COUNT_REPLICA_PATH = os.getenv("COUNT_REPLICA_PATH", "/tmp/count_replica.sqlite3")
+SOURCE_RPC = "get_last_week_data"
+RETENTION = timedelta(days=7)
+SYNC_SECONDS = 5.0
+# The replica only answers while its newest row is at most this old
+MAX_STALENESS = timedelta(hours=1)
+
+# RPCs the replica can answer
+REPLICATED_RPCS = {"get_max_min_data", "get_start_time_and_last_time", "get_find_suspicious"}
+
+# Night window for suspicious counts, JST hours [start, end)
+SUSPICIOUS_HOURS = (22, 6)
+
+_SCHEMA = """
+create table if not exists counts (
+    zone text not null default '',
+    ts real not null,
+    time text not null,
+    num integer not null,
+    primary key (zone, ts)
+);
+create index if not exists counts_ts on counts (ts);
+create table if not exists sync_state (
+    source text primary key,
+    high_water_mark text,
+    synced_at real
+);
+"""
+
+
+def _zone(row):
+    return str(row.get("zone_id", row.get("zone", "")) or "")
+
+
+class CountReplica:
+    def __init__(self, client, path=COUNT_REPLICA_PATH, source=SOURCE_RPC, sync_seconds=SYNC_SECONDS):
+        self.client = client
+        self.source = source
+        self.sync_seconds = sync_seconds
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._next_sync = 0.0
+        self.rows_synced = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("select count(*) from counts").fetchone()[0]
+
+    def is_fresh(self, max_staleness=MAX_STALENESS):
+        with self._lock:
+            newest = self._db.execute("select max(ts) from counts").fetchone()[0]
+        return newest is not None and time.time() - newest <= max_staleness.total_seconds()
+
+    def high_water_mark(self):
+        row = self._db.execute("select high_water_mark from sync_state where source = ?", (self.source,)).fetchone()
+        return row[0] if row else None
+
+    def _insert(self, rows):
+        self._db.executemany(
+            "insert or replace into counts (zone, ts, time, num) values (?, ?, ?, ?)",
+            [(_zone(row), parse_time(row["time"]).timestamp(), row["time"], row["num"] or 0) for row in rows])
+
+    def sync(self, force=False):
+        """Pull rows newer than the high-water mark; returns how many arrived."""
+        now = time.monotonic()
+        if not force and now < self._next_sync:
+            return 0
+        with self._lock:
+            self._next_sync = now + self.sync_seconds
+            hwm = self.high_water_mark()
+            query = self.client.rpc(self.source)
+            if hwm:
+                query = query.gt("time", hwm).order("time")
+            rows = query.execute().data or []
+            with self._db:
+                if rows:
+                    self._insert(rows)
+                    hwm = max(rows, key=lambda row: parse_time(row["time"]))["time"]
+                    self._db.execute(
+                        "insert or replace into sync_state (source, high_water_mark, synced_at) values (?, ?, ?)",
+                        (self.source, hwm, time.time()))
+                newest = self._db.execute("select max(ts) from counts").fetchone()[0]
+                if newest is not None:
+                    self._db.execute("delete from counts where ts < ?", (newest - RETENTION.total_seconds(),))
+            self.rows_synced += len(rows)
+            return len(rows)
+
+    def _totals(self, start, end):
+        """(ts, time, total num) per timestamp in [start, end), oldest first."""
+        with self._lock:
+            return self._db.execute(
+                "select ts, min(time), sum(num) from counts where ts >= ? and ts < ? group by ts order by ts",
+                (start.timestamp(), end.timestamp())).fetchall()
+
+    @staticmethod
+    def _day_bounds(day=None):
+        day = day or datetime.now(JST).date()
+        start = datetime(day.year, day.month, day.day, tzinfo=JST)
+        return start, start + timedelta(days=1)
+
+    def max_min(self, day=None):
+        totals = self._totals(*self._day_bounds(day))
+        if not totals:
+            return []
+        busiest = max(totals, key=lambda row: row[2])
+        quietest = min(totals, key=lambda row: row[2])
+        return [{"max_num": busiest[2], "max_time": busiest[1], "min_num": quietest[2], "min_time": quietest[1]}]
+
+    def start_and_last_time(self, day=None):
+        occupied = [row for row in self._totals(*self._day_bounds(day)) if row[2] > 0]
+        if not occupied:
+            return []
+        return [{"start_time": occupied[0][1], "last_time": occupied[-1][1]}]
+
+    def suspicious(self, since=None):
+        """Counts during night hours in the last 24 hours (or since ``since``)."""
+        end = datetime.now(JST)
+        start = since or end - timedelta(days=1)
+        totals = self._totals(start, end + timedelta(seconds=1))
+        if not totals:
+            return []
+        series = CountSeries(np.array([row[0] for row in totals], dtype="int64").astype("datetime64[s]"),
+                             [row[2] for row in totals], presorted=True)
+        night_start, night_end = SUSPICIOUS_HOURS
+        hours = series.jst_hours()
+        flagged = np.flatnonzero((series.counts > 0) & ((hours >= night_start) | (hours < night_end)))
+        return [{"event_time": totals[i][1], "num": int(series.counts[i])} for i in flagged]
+
+    def answer(self, function_name):
+        """Rows for one of the replicated RPCs, after an incremental sync."""
+        self.sync()
+        if function_name == "get_max_min_data":
+            return self.max_min()
+        if function_name == "get_start_time_and_last_time":
+            return self.start_and_last_time()
+        if function_name == "get_find_suspicious":
+            return self.suspicious()
+        raise KeyError(function_name)
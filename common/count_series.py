@@ -0,0 +1,198 @@
+"""Compact NumPy-backed people-count time series.
+
+RPCs return counts as lists of ``{"time": ..., "num": ...}`` dicts. A
+``CountSeries`` holds the same data as two arrays, UTC ``datetime64[s]``
+times and ``int32`` counts, sorted by time. Construction, slicing,
+resampling, aggregation and prompt formatting are all vectorized, so
+semester-scale windows stay small in memory and avoid per-row Python loops.
+"""
+import re
+from datetime import datetime, timezone
+
+import numpy as np
+
+from common.schedule import JST
+
+_JST_OFFSET = np.timedelta64(int(JST.utcoffset(None).total_seconds()), "s")
+_OFFSET_RE = re.compile(r"([+-])(\d{2}):?(\d{2})$")
+
+# Count stored for a row that had no value, when the caller asks to keep it apart from 0
+MISSING = -1
+
+
+def _offset_seconds(tail):
+    """Seconds east of UTC for an ISO suffix such as '+09:00', 'Z' or ''."""
+    match = _OFFSET_RE.search(tail)
+    if not match:
+        return 0
+    sign = -1 if match.group(1) == "-" else 1
+    return sign * (int(match.group(2)) * 3600 + int(match.group(3)) * 60)
+
+
+def parse_times(values):
+    """ISO-8601 strings (with or without offsets) -> UTC ``datetime64[s]``.
+
+    The date-time part is parsed by NumPy in one call; offsets are looked up
+    once per distinct suffix, since RPC results use one or two at most.
+    """
+    if not len(values):
+        return np.array([], dtype="datetime64[s]")
+    strings = [str(value) for value in values]
+    base = np.array([s[:19] for s in strings], dtype="datetime64[s]")
+    tails, inverse = np.unique([s[19:] for s in strings], return_inverse=True)
+    offsets = np.array([_offset_seconds(tail) for tail in tails], dtype="int64")[inverse]
+    return base - offsets.astype("timedelta64[s]")
+
+
+def to_datetime64(value):
+    """A datetime (naive = UTC) or ISO string as UTC ``datetime64[s]``."""
+    if isinstance(value, np.datetime64):
+        return value.astype("datetime64[s]")
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return np.datetime64(value.replace(microsecond=0), "s")
+    return parse_times([value])[0]
+
+
+class CountSeries:
+    __slots__ = ("times", "counts")
+
+    def __init__(self, times, counts, presorted=False):
+        times = np.asarray(times, dtype="datetime64[s]")
+        counts = np.asarray(counts, dtype="int32")
+        if not presorted and len(times) > 1 and np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind="stable")
+            times, counts = times[order], counts[order]
+        self.times = times
+        self.counts = counts
+
+    @classmethod
+    def from_rows(cls, rows, time_key="time", value_key="num", fill=0):
+        """Build from RPC JSON rows; rows without a value count as ``fill``."""
+        rows = rows or []
+        times = parse_times([row[time_key] for row in rows])
+        values = (row.get(value_key) for row in rows)
+        counts = np.fromiter((fill if v is None else v for v in values), dtype="int32", count=len(rows))
+        return cls(times, counts)
+
+    @classmethod
+    def from_batches(cls, batches, time_key="time", value_key="num"):
+        """Build from an iterable of row pages (see ``common.pagination``)."""
+        parts = [cls.from_rows(batch, time_key, value_key) for batch in batches]
+        if not parts:
+            return cls([], [])
+        return cls(np.concatenate([p.times for p in parts]), np.concatenate([p.counts for p in parts]))
+
+    def __len__(self):
+        return len(self.times)
+
+    def __bool__(self):
+        return len(self.times) > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return CountSeries(self.times[index], self.counts[index], presorted=True)
+        return self.times[index], int(self.counts[index])
+
+    @property
+    def nbytes(self):
+        return self.times.nbytes + self.counts.nbytes
+
+    def between(self, start=None, end=None):
+        """Points with start <= time < end (either bound may be None)."""
+        lo = 0 if start is None else np.searchsorted(self.times, to_datetime64(start), "left")
+        hi = len(self) if end is None else np.searchsorted(self.times, to_datetime64(end), "left")
+        return self[lo:hi]
+
+    def last(self, duration):
+        """Points in the ``duration`` (a timedelta) before the newest point."""
+        if not len(self):
+            return self
+        return self.between(self.times[-1] - np.timedelta64(int(duration.total_seconds()), "s"), None)
+
+    def resample(self, seconds, how="mean"):
+        """Aggregate into ``seconds``-wide buckets; returns a new series.
+
+        ``how`` is "mean" (rounded), "sum", "max", "min" or "last". Empty
+        buckets are dropped.
+        """
+        if not len(self):
+            return self
+        step = np.int64(seconds)
+        buckets = self.times.astype("int64") // step
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        times = (buckets[starts] * step).astype("datetime64[s]")
+        counts = self.counts.astype("int64")
+        if how == "sum":
+            values = np.add.reduceat(counts, starts)
+        elif how == "mean":
+            sizes = np.diff(np.r_[starts, len(counts)])
+            values = np.rint(np.add.reduceat(counts, starts) / sizes)
+        elif how == "max":
+            values = np.maximum.reduceat(counts, starts)
+        elif how == "min":
+            values = np.minimum.reduceat(counts, starts)
+        elif how == "last":
+            values = counts[np.r_[starts[1:] - 1, len(counts) - 1]]
+        else:
+            raise ValueError(f"Unknown aggregation: {how}")
+        return CountSeries(times, values, presorted=True)
+
+    def max(self):
+        return int(self.counts.max()) if len(self) else None
+
+    def min(self):
+        return int(self.counts.min()) if len(self) else None
+
+    def mean(self):
+        return float(self.counts.mean()) if len(self) else None
+
+    def argmax_time(self):
+        return self.times[int(self.counts.argmax())] if len(self) else None
+
+    def argmin_time(self):
+        return self.times[int(self.counts.argmin())] if len(self) else None
+
+    def jst_hours(self):
+        """Hour of day (0-23) in JST for every point."""
+        local = (self.times + _JST_OFFSET).astype("int64")
+        return (local // 3600) % 24
+
+    def jst_minutes(self):
+        return ((self.times + _JST_OFFSET).astype("int64") // 60) % 60
+
+    def jst_weekdays(self):
+        """Day of week in JST, 0 = Monday."""
+        days = (self.times + _JST_OFFSET).astype("datetime64[D]").astype("int64")
+        # 1970-01-01 was a Thursday
+        return (days + 3) % 7
+
+    def time_strings(self):
+        """ISO strings with an explicit +00:00 offset, as Supabase returns them."""
+        return np.char.replace(np.datetime_as_string(self.times, unit="s", timezone="UTC"), "Z", "+00:00")
+
+    def format_lines(self, label="Number of People", time_label="Time", missing="no data"):
+        """Prompt lines '• Time: <time> - <label>: <count>' joined by newlines.
+
+        ``MISSING`` counts are written as ``missing`` rather than as a number.
+        """
+        if not len(self):
+            return ""
+        # A list comprehension over tolist() beats np.char concatenation here
+        times = np.datetime_as_string(self.times, unit="s").tolist()
+        counts = self.counts.astype(object)
+        counts[self.counts == MISSING] = missing
+        return "\n".join([f"• {time_label}: {t}+00:00 - {label}: {c}" for t, c in zip(times, counts.tolist())])
+
+    def to_rows(self, time_key="time", value_key="num"):
+        return [{time_key: t, value_key: int(c)} for t, c in zip(self.time_strings().tolist(), self.counts.tolist())]
+
+
+def format_counts(rows, label="Number of People", time_key="time", value_key="num"):
+    """Prompt lines for RPC count rows, via ``CountSeries.format_lines``.
+
+    Times are written in UTC. A row without a count is shown as "no data",
+    not as 0 people.
+    """
+    return CountSeries.from_rows(rows, time_key, value_key, fill=MISSING).format_lines(label)
@@ -0,0 +1,149 @@
+"""Bucketed summaries of people counts as compact prompt tables.
+
+At LiDAR sampling rates a week of counts is thousands of
+``• Time: ... - Number of People: ...`` lines. ``bucket_stats`` reduces a
+``CountSeries`` to per-bucket mean, max, 90th percentile and min (buckets
+aligned to JST, hourly by default) and ``weekday_profile`` to the mean and
+max per JST weekday and hour, both without per-row Python loops. The
+``*_table`` functions render them with the date written once per day, so
+the prompt keeps the shape of the week at a fraction of the tokens.
+"""
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from common.count_series import CountSeries
+from common.schedule import JST
+
+BUCKET_SECONDS = int(os.getenv("COUNT_SUMMARY_BUCKET_SECONDS", "3600"))
+QUANTILE = 0.9
+WEEKDAYS = "月火水木金土日"
+
+_JST_OFFSET = np.timedelta64(int(JST.utcoffset(None).total_seconds()), "s")
+
+
+@dataclass
+class BucketStats:
+    # Bucket start in JST wall-clock time, and per-bucket statistics
+    starts: np.ndarray
+    size: np.ndarray
+    mean: np.ndarray
+    max: np.ndarray
+    p90: np.ndarray
+    min: np.ndarray
+
+    def __len__(self):
+        return len(self.starts)
+
+
+def _group_starts(keys):
+    """Indices where a run of equal (sorted) keys begins."""
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+
+
+def _grouped_quantile(values, keys, starts, sizes, q):
+    """Linear-interpolated ``q`` quantile of each run of equal sorted ``keys``."""
+    ordered = values[np.lexsort((values, keys))].astype("float64")
+    pos = (sizes - 1) * q
+    lo = np.floor(pos).astype("int64")
+    hi = np.minimum(lo + 1, sizes - 1)
+    return ordered[starts + lo] + (pos - lo) * (ordered[starts + hi] - ordered[starts + lo])
+
+
+def bucket_stats(series, seconds=BUCKET_SECONDS, quantile=QUANTILE):
+    """Per-bucket size/mean/max/quantile/min of a (time-sorted) series."""
+    if not len(series):
+        empty = np.array([], dtype="int64")
+        return BucketStats(np.array([], dtype="datetime64[s]"), empty, empty, empty, empty, empty)
+    step = np.int64(seconds)
+    buckets = (series.times + _JST_OFFSET).astype("int64") // step
+    starts = _group_starts(buckets)
+    counts = series.counts.astype("int64")
+    sizes = np.diff(np.r_[starts, len(counts)])
+    return BucketStats(
+        starts=(buckets[starts] * step).astype("datetime64[s]"),
+        size=sizes,
+        mean=np.add.reduceat(counts, starts) / sizes,
+        max=np.maximum.reduceat(counts, starts),
+        p90=_grouped_quantile(counts, buckets, starts, sizes, quantile),
+        min=np.minimum.reduceat(counts, starts),
+    )
+
+
+def weekday_profile(series):
+    """(weekday, hour, mean, max) arrays over the JST weekday-hours present."""
+    if not len(series):
+        empty = np.array([], dtype="int64")
+        return empty, empty, empty.astype("float64"), empty
+    keys = series.jst_weekdays() * 24 + series.jst_hours()
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    counts = series.counts.astype("int64")[order]
+    starts = _group_starts(keys)
+    sizes = np.diff(np.r_[starts, len(counts)])
+    means = np.add.reduceat(counts, starts) / sizes
+    return keys[starts] // 24, keys[starts] % 24, means, np.maximum.reduceat(counts, starts)
+
+
+def _bucket_label(seconds):
+    if seconds % 86400 == 0:
+        return f"{seconds // 86400}日ごと" if seconds > 86400 else "日ごと"
+    if seconds % 3600 == 0:
+        return f"{seconds // 3600}時間ごと" if seconds > 3600 else "1時間ごと"
+    return f"{seconds // 60}分ごと"
+
+
+def summary_table(series, seconds=BUCKET_SECONDS, label="人数"):
+    """Bucket statistics as '<HH:MM> mean/max/p90/min' lines grouped by JST day."""
+    stats = bucket_stats(series, seconds)
+    if not len(stats):
+        return ""
+    minutes = np.datetime_as_string(stats.starts, unit="m").tolist()
+    days = stats.starts.astype("datetime64[D]")
+    weekdays = ((days.astype("int64") + 3) % 7).tolist()
+    cells = [f"{mean:.1f}/{hi}/{p90:.0f}/{lo}" for mean, hi, p90, lo in
+             zip(stats.mean.tolist(), stats.max.tolist(), stats.p90.tolist(), stats.min.tolist())]
+    lines = [f"({label} {_bucket_label(seconds)} JST: 平均/最大/P90/最小)"]
+    previous_day = None
+    for stamp, weekday, cell in zip(minutes, weekdays, cells):
+        day = f"{stamp[5:7]}/{stamp[8:10]}({WEEKDAYS[weekday]})"
+        if seconds >= 86400:
+            lines.append(f"{day} {cell}")
+            continue
+        if day != previous_day:
+            lines.append(day)
+            previous_day = day
+        lines.append(f" {stamp[11:16]} {cell}")
+    return "\n".join(lines)
+
+
+def weekday_profile_table(series, weekdays=None, label="人数"):
+    """One line per JST weekday: 'hour mean/max' for every hour with data."""
+    days, hours, means, maxs = weekday_profile(series)
+    if not len(days):
+        return ""
+    lines = [f"(曜日別 {label} JST 時: 平均/最大)"]
+    for weekday in range(7):
+        if weekdays is not None and weekday not in weekdays:
+            continue
+        mask = days == weekday
+        if not mask.any():
+            continue
+        cells = [f"{hour:02d} {mean:.1f}/{hi}" for hour, mean, hi in
+                 zip(hours[mask].tolist(), means[mask].tolist(), maxs[mask].tolist())]
+        lines.append(f"{WEEKDAYS[weekday]}: " + ", ".join(cells))
+    return "\n".join(lines)
+
+
+def summarize_counts(rows, seconds=BUCKET_SECONDS, profile_weekdays=None, value_key="num", time_key="time", label="人数"):
+    """Summary table of RPC count rows, optionally followed by weekday profiles.
+
+    ``profile_weekdays`` is an iterable of JST weekdays (0 = Monday) to add
+    profiles for, e.g. the weekday being predicted.
+    """
+    series = CountSeries.from_rows(rows, time_key, value_key)
+    text = summary_table(series, seconds, label)
+    if profile_weekdays is not None and text:
+        text += "\n" + weekday_profile_table(series, set(profile_weekdays), label)
+    return text
@@ -0,0 +1,71 @@
+"""The aggregate "dashboard context" RPC and a local stand-in for it.
+
+``common.data_access`` can fetch every dataset a chat answer needs in one
+round trip by calling a single RPC that returns a JSON object keyed by
+dataset name, for example on the database side:
+
+    create or replace function get_dashboard_context(datasets text[])
+    returns json language sql stable as $$
+      select json_build_object(
+        'current_data',   (select json_agg(t) from get_current_time_data() t),
+        'suspicious_data', (select json_agg(t) from get_find_suspicious() t),
+        ...
+      )
+    $$;
+
+Datasets that were not asked for may be omitted or null. Once the function
+is deployed, set ``SUPABASE_AGGREGATE_RPC=get_dashboard_context`` to use it;
+until then the data-access layer fetches one RPC per dataset.
+
+``LocalDashboardClient`` answers the aggregate RPC on the client side by
+running the per-dataset RPCs itself, so the bundle path can be exercised
+and benchmarked without the database function.
+"""
+from common.data_access import AGGREGATE_RPC, AGGREGATE_RPC_NAME, DATASETS
+
+
+def build_dashboard_context(run_query, datasets):
+    """The aggregate RPC's result: {dataset: rows} for ``datasets``.
+
+    ``run_query(function_name, params)`` returns the rows of one RPC.
+    """
+    context = {}
+    for name in datasets:
+        if name not in DATASETS:
+            continue
+        function_name, params, _ = DATASETS[name]
+        context[name] = run_query(function_name, params)
+    return context
+
+
+class _Response:
+    def __init__(self, data):
+        self.data = data
+
+
+class _LocalCall:
+    def __init__(self, run_query, datasets):
+        self._run_query = run_query
+        self._datasets = datasets
+
+    def execute(self):
+        return _Response(build_dashboard_context(self._run_query, self._datasets))
+
+
+class LocalDashboardClient:
+    """Wrap a Supabase client so the aggregate RPC works offline.
+
+    Every other RPC goes to the wrapped client. ``run_query`` replaces how
+    the aggregate computes each dataset (default: an RPC on ``client``).
+    """
+
+    def __init__(self, client, run_query=None, function_name=None):
+        self.client = client
+        self.function_name = function_name or AGGREGATE_RPC or AGGREGATE_RPC_NAME
+        self._run_query = run_query or (lambda name, params: client.rpc(name, params).execute().data)
+
+    def rpc(self, function_name, params=None):
+        if function_name == self.function_name:
+            datasets = (params or {}).get("datasets") or list(DATASETS)
+            return _LocalCall(self._run_query, datasets)
+        return self.client.rpc(function_name, params)
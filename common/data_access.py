@@ -0,0 +1,416 @@
+"""Async data-access layer for the Supabase RPCs used by the handlers.
+
+All datasets of a request are fetched concurrently, each with its own
+timeout, on a bounded thread pool (supabase-py is synchronous), so a
+handler waits for the slowest RPC instead of the sum of all of them. A
+timed-out RPC is cancelled from the caller's point of view and reported in
+the bundle's ``errors`` instead of failing the whole request.
+
+Results are served from ``common.rpc_cache`` while they are fresh, so warm
+invocations skip the round trip for slow-changing datasets such as zones.
+Concurrent callers asking for the same RPC and params while it is in flight
+share that one call instead of each sending their own. RPCs listed in
+``ROLLING_RPCS`` are served from a ``common.rolling_buffer.RollingBuffer``
+that only fetches rows newer than what it already holds. With
+``COUNT_REPLICA_ENABLED=1`` the simple count aggregates are answered by the
+SQLite replica in ``common.count_replica`` instead of their RPCs. It is off
+by default: its queries reimplement RPCs whose SQL is not in this repo and
+have not been checked against them yet.
+
+When ``AGGREGATE_RPC`` is set (it is off by default), the remaining datasets
+are requested in one round trip from an aggregate RPC returning
+``{dataset: rows}`` (see ``common.dashboard_context``). If the RPC does not
+exist in the database the container stops trying; if it fails or misses its
+short ``AGGREGATE_TIMEOUT``, the parallel per-RPC path takes over and the
+aggregate's circuit breaker keeps a failing aggregate from being retried on
+every request.
+
+Every RPC sits behind a circuit breaker (``common.circuit_breaker``). A
+dataset whose RPC fails, times out or has an open breaker is filled from the
+last good copy in ``common.rpc_cache`` when there is one, and its age is
+recorded in the bundle so handlers can annotate or drop that context.
+"""
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from dataclasses import dataclass, field, fields
+from typing import Dict, List, Optional
+
+from common import rpc_cache
+from common.circuit_breaker import CircuitOpenError, breaker_states, get_breaker
+from common.count_replica import REPLICATED_RPCS, CountReplica
+from common.rolling_buffer import RollingBuffer
+
+# dataset -> (rpc name, rpc params, timeout in seconds)
+DATASETS = {
+    "current_data": ("get_current_time_data", None, 3.0),
+    "last_week_data": ("get_last_week_data", None, 8.0),
+    "suspicious_data": ("get_find_suspicious", None, 5.0),
+    "project_times": ("get_start_time_and_last_time", None, 5.0),
+    "max_min": ("get_max_min_data", None, 5.0),
+    "interval_data": ("get_thirdfloor_hourdata", {"hours_interval": 1}, 5.0),
+    "weather_times": ("get_weather_data_for_next_days", {"num_days": 1}, 3.0),
+    "zone_data": ("get_thirdfloor_zones", None, 3.0),
+}
+
+# Name of the aggregate function sketched in common.dashboard_context
+AGGREGATE_RPC_NAME = "get_dashboard_context"
+# One-round-trip RPC returning {dataset: rows}; opt in (e.g. AGGREGATE_RPC_NAME)
+# once the function is deployed, empty disables bundle mode
+AGGREGATE_RPC = os.getenv("SUPABASE_AGGREGATE_RPC", "")
+# The aggregate gets a short deadline so a slow call still leaves the per-RPC
+# fallback its own timeouts
+AGGREGATE_TIMEOUT = float(os.getenv("SUPABASE_AGGREGATE_TIMEOUT", "1.5"))
+
+# RPCs returning a rolling time window, fetched incrementally
+ROLLING_RPCS = {"get_last_week_data"}
+
+COUNT_REPLICA_ENABLED = os.getenv("COUNT_REPLICA_ENABLED", "0") == "1"
+
+MAX_WORKERS = len(DATASETS)
+
+# Shared across warm invocations; bounded so bursts cannot spawn unbounded threads
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="supabase-rpc")
+
+
+@dataclass
+class DataBundle:
+    """Results of one concurrent fetch; a dataset is None when it failed or was empty."""
+
+    current_data: Optional[List[dict]] = None
+    last_week_data: Optional[List[dict]] = None
+    suspicious_data: Optional[List[dict]] = None
+    project_times: Optional[List[dict]] = None
+    max_min: Optional[List[dict]] = None
+    interval_data: Optional[List[dict]] = None
+    weather_times: Optional[List[dict]] = None
+    zone_data: Optional[List[dict]] = None
+    requested: List[str] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    cache_hits: List[str] = field(default_factory=list)
+    aggregated: List[str] = field(default_factory=list)
+    stale_age_seconds: Dict[str, float] = field(default_factory=dict)
+
+    def missing(self):
+        """Requested datasets that came back empty or failed, in request order."""
+        return [name for name in self.requested if not getattr(self, name)]
+
+    def staleness_note(self):
+        """Prompt note naming the datasets served from a stale copy."""
+        if not self.stale_age_seconds:
+            return ""
+        return "注意: 次のデータは取得できなかったため古いコピーです: " + ", ".join(
+            f"{name} ({age / 60:.0f}分前)" for name, age in self.stale_age_seconds.items())
+
+    def metadata(self):
+        """Degradation report for the response body."""
+        return {
+            "missing": self.missing(),
+            "stale_age_seconds": {name: round(age) for name, age in self.stale_age_seconds.items()},
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "breakers": breaker_states([DATASETS[name][0] for name in self.requested]),
+        }
+
+    def as_dict(self):
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name in DATASETS}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller runs the function; callers arriving while it is in
+    flight wait for it and get the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.shared += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+            return call["result"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+
+_single_flight = SingleFlight()
+
+
+_buffers = {}
+_buffers_lock = threading.Lock()
+
+
+def rolling_buffer(client, function_name="get_last_week_data"):
+    """The container's buffer for ``function_name`` on ``client``."""
+    key = (id(client), function_name)
+    with _buffers_lock:
+        buffer = _buffers.get(key)
+        if buffer is None:
+            buffer = _buffers[key] = RollingBuffer(client, function_name)
+        return buffer
+
+
+_replicas = {}
+
+
+def count_replica(client):
+    """The container's SQLite replica of the count history for ``client``."""
+    with _buffers_lock:
+        replica = _replicas.get(id(client))
+        if replica is None:
+            replica = _replicas[id(client)] = CountReplica(client)
+        return replica
+
+
+def _from_replica(client, function_name):
+    """Replica answer, or None to fall back to the RPC."""
+    try:
+        replica = count_replica(client)
+        rows = replica.answer(function_name)
+        return rows if replica.is_fresh() else None
+    except Exception as e:
+        print(f"Count replica failed for {function_name}, using the RPC: {str(e)}")
+        return None
+
+
+def _run_rpc(client, function_name, params):
+    if COUNT_REPLICA_ENABLED and function_name in REPLICATED_RPCS and not params:
+        rows = _from_replica(client, function_name)
+        if rows is not None:
+            return rows
+    if function_name in ROLLING_RPCS and not params:
+        rows = rolling_buffer(client, function_name).rows()
+    else:
+        rows = client.rpc(function_name, params).execute().data
+    rpc_cache.store(function_name, params, rows)
+    return rows
+
+
+def execute_rpc(client, function_name, params=None, abandoned=None):
+    """Run one RPC and return its rows; raises on failure.
+
+    Identical calls already in flight (same client, RPC name and params) are
+    joined instead of repeated. ``abandoned`` is a ``threading.Event`` the
+    caller sets when it stops waiting; a call that finishes after that is not
+    reported to the breaker, since the caller already recorded the timeout.
+    """
+    breaker = get_breaker(function_name)
+    if not breaker.allow():
+        raise CircuitOpenError(f"circuit open for {function_name}")
+
+    def guarded():
+        # Only the single-flight leader reports to the breaker
+        try:
+            rows = _run_rpc(client, function_name, params)
+        except Exception as e:
+            if not (abandoned and abandoned.is_set()):
+                breaker.record_failure(e)
+            raise
+        if not (abandoned and abandoned.is_set()):
+            breaker.record_success()
+        return rows
+
+    key = (id(client),) + rpc_cache.cache_key(function_name, params)
+    return _single_flight.do(key, guarded)
+
+
+def fetch_data_from_supabase(client, function_name, params=None):
+    cached = rpc_cache.get_cached(function_name, params)
+    if cached is not None:
+        return cached
+    try:
+        data = execute_rpc(client, function_name, params)
+        if data:
+            return data
+        print(f"No data returned by {function_name}.")
+        return None
+    except Exception as e:
+        print(f"Error fetching {function_name}: {str(e)}")
+        stale = rpc_cache.get_last_good(function_name, params)
+        if stale:
+            print(f"Using the copy of {function_name} from {stale[1]:.0f}s ago")
+            return stale[0]
+        return None
+
+
+async def _fetch_uncached(client, name, timeout=None):
+    function_name, params, default_timeout = DATASETS[name]
+    timeout = timeout or default_timeout
+    loop = asyncio.get_running_loop()
+    abandoned = threading.Event()
+    future = loop.run_in_executor(_executor, execute_rpc, client, function_name, params, abandoned)
+    try:
+        return (await asyncio.wait_for(future, timeout)) or None, None
+    except asyncio.TimeoutError:
+        # The worker thread cannot be interrupted, but nobody waits for it now
+        abandoned.set()
+        print(f"Timed out fetching {function_name} after {timeout}s")
+        get_breaker(function_name).record_failure("timeout")
+        return None, "timeout"
+    except Exception as e:
+        print(f"Error fetching {function_name}: {str(e)}")
+        return None, str(e)
+
+
+async def fetch_dataset(client, name, timeout=None):
+    """Fetch one dataset; returns (data, error) where error is None on success."""
+    function_name, params, _ = DATASETS[name]
+    cached = rpc_cache.get_cached(function_name, params)
+    if cached is not None:
+        return cached, None
+    return await _fetch_uncached(client, name, timeout)
+
+
+# id(client) -> False once the aggregate RPC turned out not to exist
+_aggregate_available = {}
+
+
+def _is_missing_function(error):
+    # PostgREST answers PGRST202 when the called function does not exist
+    return getattr(error, "code", None) == "PGRST202" or "Could not find the function" in str(error)
+
+
+async def fetch_aggregate(client, names, timeout=None, function_name=AGGREGATE_RPC):
+    """Fetch ``names`` with one call to the aggregate RPC.
+
+    Returns {dataset: rows} for the datasets the RPC answered, or None when
+    the call failed or took longer than ``timeout`` (default
+    ``AGGREGATE_TIMEOUT``); the caller fetches whatever is missing one by one.
+    """
+    timeout = timeout or AGGREGATE_TIMEOUT
+    params = {"datasets": list(names)}
+    loop = asyncio.get_running_loop()
+    abandoned = threading.Event()
+    future = loop.run_in_executor(_executor, execute_rpc, client, function_name, params, abandoned)
+    try:
+        payload = await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        abandoned.set()
+        print(f"Timed out fetching {function_name} after {timeout}s, using per-RPC fetches")
+        get_breaker(function_name).record_failure("timeout")
+        return None
+    except Exception as e:
+        if _is_missing_function(e):
+            print(f"{function_name} is not available, using per-RPC fetches")
+            _aggregate_available[id(client)] = False
+        else:
+            print(f"Error fetching {function_name}: {str(e)}")
+        return None
+    if isinstance(payload, list) and len(payload) == 1:
+        # A function returning one json row comes back as a one-element list
+        payload = payload[0]
+    if isinstance(payload, dict) and len(payload) == 1 and function_name in payload:
+        payload = payload[function_name]
+    if not isinstance(payload, dict):
+        print(f"Unexpected {function_name} result: {type(payload).__name__}")
+        return None
+
+    results = {}
+    for name in names:
+        rows = payload.get(name)
+        if rows is not None:
+            function, rpc_params, _ = DATASETS[name]
+            rpc_cache.store(function, rpc_params, rows)
+            results[name] = rows
+    return results
+
+
+async def fetch_bundle(client, datasets=None, timeouts=None, aggregate=None):
+    """Fetch ``datasets`` (default: all) concurrently into a DataBundle.
+
+    ``aggregate`` names the aggregate RPC to try first (default
+    ``AGGREGATE_RPC``; pass "" to force the per-RPC path).
+    """
+    datasets = list(datasets or DATASETS)
+    timeouts = timeouts or {}
+    aggregate = AGGREGATE_RPC if aggregate is None else aggregate
+    bundle = DataBundle(requested=datasets)
+    results = {}
+
+    remaining = []
+    for name in datasets:
+        function_name, params, _ = DATASETS[name]
+        cached = rpc_cache.get_cached(function_name, params)
+        if cached is not None:
+            bundle.cache_hits.append(name)
+            bundle.timings_ms[name] = 0.0
+            results[name] = (cached, None)
+        else:
+            remaining.append(name)
+
+    async def timed(name):
+        start = time.perf_counter()
+        result = await _fetch_uncached(client, name, timeouts.get(name))
+        bundle.timings_ms[name] = (time.perf_counter() - start) * 1000
+        return result
+
+    async def bundled(names):
+        start = time.perf_counter()
+        answered = await fetch_aggregate(client, names, function_name=aggregate) or {}
+        elapsed = (time.perf_counter() - start) * 1000
+        for name, rows in answered.items():
+            bundle.aggregated.append(name)
+            bundle.timings_ms[name] = elapsed
+            results[name] = (rows or None, None)
+        missing = [name for name in names if name not in answered]
+        for name, result in zip(missing, await asyncio.gather(*(timed(name) for name in missing))):
+            results[name] = result
+
+    # Rolling datasets stay on their incremental path, and with the replica
+    # enabled its datasets are answered locally rather than by the aggregate
+    local = ROLLING_RPCS | (REPLICATED_RPCS if COUNT_REPLICA_ENABLED else set())
+    to_bundle = []
+    if aggregate and _aggregate_available.get(id(client), True):
+        to_bundle = [name for name in remaining if DATASETS[name][0] not in local]
+    if len(to_bundle) < 2:
+        to_bundle = []
+    singles = [name for name in remaining if name not in to_bundle]
+
+    async def single(name):
+        results[name] = await timed(name)
+
+    tasks = [single(name) for name in singles]
+    if to_bundle:
+        tasks.append(bundled(to_bundle))
+    await asyncio.gather(*tasks)
+
+    for name in datasets:
+        data, error = results[name]
+        if error:
+            bundle.errors[name] = error
+            function_name, params, _ = DATASETS[name]
+            stale = rpc_cache.get_last_good(function_name, params)
+            if stale:
+                data = stale[0]
+                bundle.stale_age_seconds[name] = stale[1]
+        setattr(bundle, name, data)
+    return bundle
+
+
+def fetch_bundle_sync(client, datasets=None, timeouts=None, aggregate=None):
+    """Blocking wrapper for the synchronous Lambda handlers."""
+    return asyncio.run(fetch_bundle(client, datasets, timeouts, aggregate))
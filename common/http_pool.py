@@ -0,0 +1,82 @@
+"""Pooled HTTP clients shared by the Supabase, PDF and weather calls.
+
+One module-level ``httpx.Client`` with keep-alive and tuned pool limits is
+reused across warm invocations, so only the first call to each host pays
+the TCP and TLS handshakes. HTTP/2 is used when the ``h2`` package is
+installed. The Supabase client gets the same ``httpx.Client`` through
+``ClientOptions(httpx_client=...)``; supabase-py sends its auth headers per
+request, so they never leak to the other hosts.
+
+Async code (the weather fetch) uses ``get_async_http_client``, one
+``httpx.AsyncClient`` with the same settings per event loop.
+"""
+import asyncio
+import os
+import threading
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+# Idle connections older than this are not reused
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+
+HTTP_LIMITS = httpx.Limits(
+    max_connections=HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+)
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+_client = None
+_async_clients = {}
+_lock = threading.Lock()
+
+
+def get_http_client():
+    """The shared synchronous client."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, follow_redirects=True)
+    return _client
+
+
+def get_async_http_client():
+    """The shared async client of the running event loop.
+
+    An ``AsyncClient`` is bound to the loop it first ran on, so each loop
+    gets its own; handlers that reuse one loop also reuse its connections.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            for other in [other for other in _async_clients if other.is_closed()]:
+                del _async_clients[other]
+            client = httpx.AsyncClient(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, follow_redirects=True)
+            _async_clients[loop] = client
+        return client
+
+
+def create_supabase_client(url, key):
+    """``supabase.create_client`` on top of the shared connection pool.
+
+    Falls back to supabase-py's own client on versions without
+    ``ClientOptions(httpx_client=...)``.
+    """
+    from supabase import create_client
+    try:
+        from supabase import ClientOptions
+        options = ClientOptions(httpx_client=get_http_client())
+    except (ImportError, TypeError):
+        print("supabase-py cannot share an httpx client, using its own connections")
+        return create_client(url, key)
+    return create_client(url, key, options=options)
@@ -0,0 +1,90 @@
+"""Build-time step that compiles the knowledge-base PDFs into one artifact.
+
+    python -m common.kb_compile [--output PATH] [name=url ...]
+
+The artifact is gzip-compressed JSON holding, per document, the per-page
+text, the offset of each page in the joined text and the SHA-256 of the source
+PDF, plus a checksum over all documents. Ship it next to the handler and
+``common.knowledge_base.fetch_knowledge_text`` serves text from it without
+downloading anything or importing PyPDF2.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+from common.knowledge_base import (
+    ARTIFACT_FORMAT_VERSION,
+    KB_ARTIFACT_PATH,
+    artifact_checksum,
+    extract_pages_from_pdf,
+    fetch_knowledge_pdf,
+    peak_rss_mb,
+)
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
+
+
+def compile_document(name, url):
+    pdf_path = fetch_knowledge_pdf(url)
+    if not pdf_path:
+        raise RuntimeError(f"Could not download knowledge document '{name}' from {url}")
+
+    pages = extract_pages_from_pdf(pdf_path)
+    page_offsets = []
+    offset = 0
+    for page in pages:
+        page_offsets.append(offset)
+        offset += len(page)
+
+    return {
+        "name": name,
+        "url": url,
+        "sha256": os.path.splitext(os.path.basename(pdf_path))[0],
+        "pages": pages,
+        "page_offsets": page_offsets,
+        "length": offset,
+    }
+
+
+def compile_knowledge_base(documents, output_path):
+    compiled = {name: compile_document(name, url) for name, url in documents.items()}
+    artifact = {
+        "version": ARTIFACT_FORMAT_VERSION,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "checksum": artifact_checksum(compiled),
+        "documents": compiled,
+    }
+
+    payload = json.dumps(artifact, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".part"
+    with gzip.open(tmp_path, "wb", compresslevel=9) as f:
+        f.write(payload)
+    os.replace(tmp_path, output_path)
+    return artifact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile knowledge-base PDFs into a text artifact.")
+    parser.add_argument("--output", default=KB_ARTIFACT_PATH, help="artifact path (default: %(default)s)")
+    parser.add_argument("documents", nargs="*", metavar="name=url",
+                        help="documents to compile (default: every registered document at its current version)")
+    args = parser.parse_args(argv)
+
+    if args.documents:
+        documents = dict(item.split("=", 1) for item in args.documents)
+    else:
+        KNOWLEDGE_REGISTRY.refresh_if_due()
+        documents = {name: KNOWLEDGE_REGISTRY.get(name).url for name in KNOWLEDGE_REGISTRY.names()}
+
+    artifact = compile_knowledge_base(documents, args.output)
+    for name, doc in artifact["documents"].items():
+        print(f"{name}: {len(doc['pages'])} pages, {doc['length']} chars, pdf {doc['sha256'][:12]}")
+    print(f"Wrote {args.output} (checksum {artifact['checksum'][:12]}, peak RSS {peak_rss_mb():.1f} MB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
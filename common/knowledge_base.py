@@ -0,0 +1,355 @@
+"""Shared fetcher for the knowledge-base PDFs (minohc schedule, solvecrowd).
+
+Downloads are conditional (ETag / If-Modified-Since) and both the raw PDF
+bytes and the extracted text are stored under the SHA-256 of the PDF bytes.
+Warm invocations reuse the in-process copy, and containers that mount the same
+volume (set ``KB_CACHE_DIR``) reuse each other's downloads and extracted text.
+
+When a compiled artifact (see ``common.kb_compile``) is bundled with the
+handler, the text is served from it and nothing is downloaded or parsed.
+
+Downloads are streamed to disk in chunks and PDFs are parsed from a
+memory-mapped file, so peak memory does not grow with the PDF size. Page
+text is cached by a hash of each page's content, and large PDFs extract
+their uncached pages in a process pool, so a PDF with one changed page only
+re-extracts that page.
+"""
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import mmap
+import multiprocessing
+import os
+import resource
+import tempfile
+
+import httpx
+
+from common.http_pool import get_http_client
+
+KB_CACHE_DIR = os.getenv("KB_CACHE_DIR", "/tmp/knowledge_base")
+KB_ARTIFACT_PATH = os.getenv(
+    "KB_ARTIFACT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json.gz"),
+)
+ARTIFACT_FORMAT_VERSION = 1
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+# Below this many uncached pages, process start-up costs more than it saves
+PARALLEL_MIN_PAGES = int(os.getenv("KB_PARALLEL_MIN_PAGES", "8"))
+
+# url -> {'sha256': ..., 'text': ...} for the lifetime of the container
+_memory = {}
+_artifact = None
+# page content hash -> extracted page text
+_page_texts = {}
+
+
+def _object_path(sha256, suffix):
+    return os.path.join(KB_CACHE_DIR, "objects", f"{sha256}{suffix}")
+
+
+def _meta_path(url):
+    url_key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(KB_CACHE_DIR, "meta", f"{url_key}.json")
+
+
+def _atomic_write(path, data):
+    # Write next to the target and rename so readers on a shared volume never
+    # see a half-written file.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux (the Lambda runtime)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _stream_to_object(response):
+    """Stream a response body into the object store; return its SHA-256.
+
+    The body is written in DOWNLOAD_CHUNK_BYTES pieces to a temporary file
+    while being hashed, then renamed to its content-addressed name.
+    """
+    objects_dir = os.path.join(KB_CACHE_DIR, "objects")
+    os.makedirs(objects_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=objects_dir, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in response.iter_bytes(chunk_size=DOWNLOAD_CHUNK_BYTES):
+                digest.update(chunk)
+                f.write(chunk)
+        sha256 = digest.hexdigest()
+        pdf_path = _object_path(sha256, ".pdf")
+        if os.path.exists(pdf_path):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, pdf_path)
+        return sha256
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_meta(url):
+    try:
+        with open(_meta_path(url), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(url, meta):
+    _atomic_write(_meta_path(url), json.dumps(meta).encode("utf-8"))
+
+
+def _page_hash(page):
+    """Hash of everything that decides a page's extracted text.
+
+    That is the content stream plus, per font, its name, encoding and
+    ToUnicode map (which is what turns CJK glyph ids back into characters).
+    """
+    digest = hashlib.sha256()
+    contents = page.get_contents()
+    digest.update(contents.get_data() if contents is not None else b"")
+
+    resources = page.get("/Resources")
+    fonts = resources.get_object().get("/Font") if resources is not None else None
+    if fonts is not None:
+        fonts = fonts.get_object()
+        for name in sorted(fonts):
+            font = fonts[name].get_object()
+            digest.update(f"{name}:{font.get('/BaseFont')}:{font.get('/Encoding')}".encode("utf-8"))
+            to_unicode = font.get("/ToUnicode")
+            if to_unicode is not None:
+                digest.update(to_unicode.get_object().get_data())
+    return digest.hexdigest()
+
+
+def _page_text_path(page_hash):
+    return os.path.join(KB_CACHE_DIR, "pages", f"{page_hash}.txt")
+
+
+def _cached_page_text(page_hash):
+    text = _page_texts.get(page_hash)
+    if text is None:
+        try:
+            with open(_page_text_path(page_hash), "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        _page_texts[page_hash] = text
+    return text
+
+
+def _store_page_text(page_hash, text):
+    _page_texts[page_hash] = text
+    _atomic_write(_page_text_path(page_hash), text.encode("utf-8"))
+
+
+def _open_pdf(file):
+    # Imported here so handlers serving from the artifact never load PyPDF2
+    from PyPDF2 import PdfReader
+
+    # PdfReader seeks around the mapped file; pages are paged in by the OS on
+    # demand instead of being read into a Python bytes object
+    mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    return PdfReader(mapped), mapped
+
+
+def _extract_page_range(pdf_path, page_numbers):
+    # Runs in a worker process, which opens its own reader
+    with open(pdf_path, "rb") as file:
+        reader, mapped = _open_pdf(file)
+        try:
+            return [reader.pages[i].extract_text() for i in page_numbers]
+        finally:
+            mapped.close()
+
+
+def _extract_in_pool(pdf_path, page_numbers, max_workers):
+    # Contiguous batches, one per worker, so each worker parses the xref once
+    size = -(-len(page_numbers) // max_workers)
+    batches = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+    # Spawned, not forked: the handler process runs data-access and
+    # write-behind threads whose locks a forked child could inherit held
+    context = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=len(batches), mp_context=context) as executor:
+        results = executor.map(_extract_page_range, [pdf_path] * len(batches), batches)
+        # executor.map yields in submission order, so page order is preserved
+        return [text for batch in results for text in batch]
+
+
+# Extract text from the PDF, one string per page
+def extract_pages_from_pdf(pdf_path, max_workers=None):
+    """Return the text of every page, in page order.
+
+    Pages whose content hash is already cached are not extracted again. When
+    at least PARALLEL_MIN_PAGES pages are left they are extracted in a
+    process pool; where processes are unavailable (AWS Lambda has no
+    /dev/shm for multiprocessing) or the pool fails, extraction falls back to
+    this process.
+    """
+    with open(pdf_path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+        reader, mapped = _open_pdf(file)
+        try:
+            page_hashes = [_page_hash(page) for page in reader.pages]
+            texts = [_cached_page_text(page_hash) for page_hash in page_hashes]
+            missing = [i for i, text in enumerate(texts) if text is None]
+
+            max_workers = max_workers or os.cpu_count() or 1
+            extracted = None
+            if len(missing) >= PARALLEL_MIN_PAGES and max_workers > 1:
+                try:
+                    extracted = _extract_in_pool(pdf_path, missing, max_workers)
+                except Exception as e:
+                    # No /dev/shm (OSError), a worker that died (BrokenProcessPool), or
+                    # a page a worker could not parse: extract here instead
+                    print(f"Process pool extraction failed, extracting in-process: {e!r}")
+            if extracted is None:
+                extracted = [reader.pages[i].extract_text() for i in missing]
+        finally:
+            mapped.close()
+
+    for i, text in zip(missing, extracted):
+        texts[i] = text
+        _store_page_text(page_hashes[i], text)
+    if missing:
+        print(f"Extracted {len(missing)} of {len(texts)} pages from {pdf_path}")
+    return texts
+
+
+# Extract text from the PDF
+def extract_text_from_pdf(pdf_path):
+    return "".join(extract_pages_from_pdf(pdf_path))
+
+
+def artifact_checksum(documents):
+    payload = json.dumps(documents, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_knowledge_artifact(path=None):
+    """Load the compiled knowledge-base artifact, or None if it is unusable.
+
+    The artifact is loaded once per container and its checksum is verified so
+    a truncated upload falls back to the download path instead of serving
+    partial text.
+    """
+    global _artifact
+    path = path or KB_ARTIFACT_PATH
+    if _artifact is not None and _artifact["path"] == path:
+        return _artifact
+
+    try:
+        with gzip.open(path, "rb") as f:
+            artifact = json.loads(f.read().decode("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    if artifact.get("version") != ARTIFACT_FORMAT_VERSION:
+        print(f"Unsupported knowledge-base artifact version: {artifact.get('version')}")
+        return None
+    if artifact_checksum(artifact["documents"]) != artifact.get("checksum"):
+        print(f"Knowledge-base artifact checksum mismatch: {path}")
+        return None
+
+    artifact["path"] = path
+    artifact["by_url"] = {doc["url"]: doc for doc in artifact["documents"].values()}
+    _artifact = artifact
+    return artifact
+
+
+def fetch_knowledge_pdf(url, timeout=10):
+    """Return the local content-addressed path of the PDF at ``url``.
+
+    The request carries the ETag / Last-Modified of the last stored copy, so an
+    unchanged PDF costs a 304 instead of a full download. If the request fails
+    the last stored copy is used. Returns None when nothing is available.
+    """
+    meta = _read_meta(url)
+    if meta and not os.path.exists(_object_path(meta["sha256"], ".pdf")):
+        meta = None
+
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    status_code = None
+    try:
+        with get_http_client().stream("GET", url, headers=headers, timeout=timeout) as response:
+            status_code = response.status_code
+            if status_code == 200:
+                sha256 = _stream_to_object(response)
+                _write_meta(url, {
+                    "url": url,
+                    "sha256": sha256,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                })
+                pdf_path = _object_path(sha256, ".pdf")
+                print(f"File downloaded successfully to {pdf_path}")
+                return pdf_path
+    except httpx.HTTPError as e:
+        print(f"Error downloading {url}: {str(e)}")
+
+    if status_code == 304 and meta:
+        return _object_path(meta["sha256"], ".pdf")
+
+    if meta:
+        print(f"Failed to download file, using cached copy {meta['sha256']}.")
+        return _object_path(meta["sha256"], ".pdf")
+
+    print("Failed to download file.")
+    return None
+
+
+def fetch_knowledge_text(url):
+    """Return the extracted text of the knowledge-base PDF at ``url``.
+
+    Text is extracted once per PDF version and stored beside the PDF bytes, so
+    other containers sharing ``KB_CACHE_DIR`` skip PyPDF2 entirely.
+    """
+    cached = _memory.get(url)
+    if cached:
+        return cached["text"]
+
+    artifact = load_knowledge_artifact()
+    if artifact and url in artifact["by_url"]:
+        doc = artifact["by_url"][url]
+        text = "".join(doc["pages"])
+        _memory[url] = {"sha256": doc["sha256"], "text": text}
+        return text
+
+    pdf_path = fetch_knowledge_pdf(url)
+    if not pdf_path:
+        return ""
+
+    sha256 = os.path.splitext(os.path.basename(pdf_path))[0]
+    text_path = _object_path(sha256, ".txt")
+    try:
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+    except OSError:
+        text = extract_text_from_pdf(pdf_path)
+        _atomic_write(text_path, text.encode("utf-8"))
+        print(f"Extracted {len(text)} chars from {pdf_path} (peak RSS {peak_rss_mb():.1f} MB)")
+
+    _memory[url] = {"sha256": sha256, "text": text}
+    return text
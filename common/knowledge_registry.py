@@ -0,0 +1,258 @@
+"""Versioned registry of knowledge documents that load on first use.
+
+Every knowledge PDF is listed once here with its storage path and version;
+the download URL is the path plus the version as the ``?t=`` cache buster.
+The schedule goes with every question, as it always has; the other
+documents declare the question intents that need them, so a max/min or
+suspicious-person question never downloads or parses the crowd-advice PDF.
+
+Warm containers poll a small manifest (``KB_MANIFEST_URL``) at most every
+``KB_POLL_SECONDS`` with a conditional GET. When a document's version
+changes, its new text is loaded and swapped in atomically; requests already
+holding the old text keep using it.
+"""
+import os
+import threading
+import time
+from urllib.parse import quote
+
+import httpx
+
+from common.http_pool import get_http_client
+from common.knowledge_base import fetch_knowledge_text
+
+KNOWLEDGE_BASE_URL = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/"
+KB_MANIFEST_URL = os.getenv("KB_MANIFEST_URL", KNOWLEDGE_BASE_URL + "manifest.json")
+KB_POLL_SECONDS = float(os.getenv("KB_POLL_SECONDS", "60"))
+
+# Versions shipped with the code; the manifest overrides them at runtime.
+# manifest.json has the same shape, e.g.
+#   {"schedule": {"version": "2025-04-01T00:00:00.000Z"},
+#    "manual": {"path": "manual.pdf", "version": "...", "intents": ["schedule"]}}
+KNOWLEDGE_DOCUMENTS = {
+    "schedule": {
+        "path": "minohcSchdeule.pdf",
+        "version": "2024-11-28T11:38:17.614Z",
+        "intents": ["prediction", "schedule", "crowd_advice"],
+    },
+    "solvecrowd": {
+        "path": "solvecrowd.pdf",
+        "version": "2024-12-05T14:12:59.141Z",
+        "intents": ["crowd_advice"],
+    },
+}
+
+# Sent with every question; only the other documents are picked by intent
+PRIMARY_DOCUMENTS = ("schedule",)
+
+# intent -> keywords that mark a question as having that intent
+INTENT_KEYWORDS = {
+    "prediction": ["予測", "予想", "何人になる", "後の人数", "predict", "forecast"],
+    "crowd_advice": ["混雑", "混んで", "混み", "空いて", "対策", "アドバイス", "crowd", "advice"],
+    "schedule": ["授業", "予定", "スケジュール", "イベント", "休み", "行事", "schedule", "class"],
+    "max_min": ["最も多", "最も少", "一番多", "一番少", "最大", "最小", "maximum", "minimum"],
+    "suspicious": ["不審", "suspicious"],
+    "entry_exit": ["入り", "帰り", "開始時間", "終了時間"],
+}
+
+
+def classify_intents(question):
+    """Return the set of intents whose keywords appear in ``question``."""
+    lowered = question.lower()
+    return {intent for intent, keywords in INTENT_KEYWORDS.items()
+            if any(keyword in lowered for keyword in keywords)}
+
+
+def document_url(path, version, base_url=KNOWLEDGE_BASE_URL):
+    url = path if path.startswith(("http://", "https://")) else base_url + path
+    return f"{url}?t={quote(version, safe='')}" if version else url
+
+
+class KnowledgeDocument:
+    """A knowledge-base PDF whose text is fetched the first time it is read.
+
+    ``version``, ``url`` and the text live in one tuple that is replaced as a
+    whole, so readers always see a consistent version.
+    """
+
+    def __init__(self, name, url, intents, loader=fetch_knowledge_text, version=None, path=None):
+        self.name = name
+        self.path = path
+        self.intents = frozenset(intents)
+        self._loader = loader
+        self._state = (version, url, None)
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._state[0]
+
+    @property
+    def url(self):
+        return self._state[1]
+
+    @property
+    def loaded(self):
+        return self._state[2] is not None
+
+    def text(self):
+        """The document text, loading it if needed.
+
+        A failed download (empty text) is not cached, so the next read
+        tries again instead of serving an empty document for the life of the
+        container.
+        """
+        state = self._state
+        if state[2] is None:
+            with self._lock:
+                state = self._state
+                version, url, text = state
+                if text is None:
+                    text = self._loader(url)
+                    if not text:
+                        return ""
+                    state = self._state = (version, url, text)
+        return state[2]
+
+    def update(self, version, url):
+        """Point the document at a new version.
+
+        A document that was already read loads the new text before the swap,
+        so it never goes back to "not loaded" while serving traffic. If that
+        load fails the old version and text are kept, and the update is
+        tried again on a later poll.
+        """
+        if version == self.version and url == self.url:
+            return False
+        if self.loaded:
+            try:
+                new_text = self._loader(url)
+            except Exception as e:
+                new_text = ""
+                print(f"Error loading knowledge document '{self.name}' version {version}: {str(e)}")
+            if not new_text:
+                print(f"Keeping knowledge document '{self.name}' at version {self.version}")
+                return False
+            with self._lock:
+                self._state = (version, url, new_text)
+        else:
+            with self._lock:
+                self._state = (version, url, None)
+        print(f"Knowledge document '{self.name}' updated to version {version}")
+        return True
+
+
+class KnowledgeRegistry:
+    def __init__(self, manifest_url=None, poll_seconds=KB_POLL_SECONDS, base_url=KNOWLEDGE_BASE_URL):
+        self._documents = {}
+        self.manifest_url = manifest_url
+        self.poll_seconds = poll_seconds
+        self.base_url = base_url
+        self._manifest_etag = None
+        # Set when a document could not be updated, so the next poll refetches the manifest
+        self._retry_manifest = False
+        self._next_poll = 0.0
+        self._poll_lock = threading.Lock()
+
+    def register(self, name, url, intents, loader=fetch_knowledge_text, version=None, path=None):
+        self._documents[name] = KnowledgeDocument(name, url, intents, loader, version, path)
+        return self._documents[name]
+
+    def register_versioned(self, name, path, version, intents, loader=fetch_knowledge_text):
+        url = document_url(path, version, self.base_url)
+        return self.register(name, url, intents, loader, version, path)
+
+    def get(self, name):
+        return self._documents[name]
+
+    def names(self):
+        return list(self._documents)
+
+    def versions(self):
+        return {name: doc.version for name, doc in self._documents.items()}
+
+    def documents_for(self, intents):
+        """The primary documents plus the documents needed by ``intents``."""
+        return [doc for doc in self._documents.values()
+                if doc.name in PRIMARY_DOCUMENTS or doc.intents & set(intents)]
+
+    def text(self, name):
+        self.refresh_if_due()
+        return self._documents[name].text()
+
+    def texts_for_question(self, question):
+        """Return {name: text} for the primary documents and the ones the question needs.
+
+        A question that matches no intent ("今日の食堂は混む？") still gets the
+        schedule, which the prediction prompts rely on.
+        """
+        self.refresh_if_due()
+        intents = classify_intents(question)
+        return {doc.name: doc.text() for doc in self.documents_for(intents)}
+
+    def load_all(self):
+        return {name: doc.text() for name, doc in self._documents.items()}
+
+    def apply_manifest(self, manifest):
+        """Apply {name: {"version", ["path"], ["intents"]}} entries."""
+        changed = []
+        for name, entry in manifest.items():
+            version = entry.get("version")
+            doc = self._documents.get(name)
+            if doc is None:
+                if "path" not in entry:
+                    continue
+                self.register_versioned(name, entry["path"], version, entry.get("intents", []))
+                changed.append(name)
+                continue
+            path = entry.get("path") or doc.path or doc.url.split("?", 1)[0]
+            if doc.update(version, document_url(path, version, self.base_url)):
+                changed.append(name)
+            elif doc.version != version:
+                self._retry_manifest = True
+        return changed
+
+    def refresh_if_due(self, now=None):
+        """Poll the manifest if the poll interval has passed; return changed names.
+
+        The manifest request is conditional on its last ETag, so an unchanged
+        manifest costs one 304. Errors keep the current versions; a document
+        whose new version failed to load is retried on the next poll.
+        """
+        if not self.manifest_url:
+            return []
+        now = time.monotonic() if now is None else now
+        if now < self._next_poll or not self._poll_lock.acquire(blocking=False):
+            return []
+        try:
+            self._next_poll = now + self.poll_seconds
+            headers = {"If-None-Match": self._manifest_etag} if self._manifest_etag else {}
+            try:
+                response = get_http_client().get(self.manifest_url, headers=headers, timeout=2)
+            except httpx.HTTPError as e:
+                print(f"Error polling knowledge-base manifest: {str(e)}")
+                return []
+            if response.status_code != 200:
+                return []
+            try:
+                manifest = response.json()
+            except ValueError:
+                print("Knowledge-base manifest is not valid JSON.")
+                return []
+            self._retry_manifest = False
+            changed = self.apply_manifest(manifest)
+            self._manifest_etag = None if self._retry_manifest else response.headers.get("ETag")
+            return changed
+        finally:
+            self._poll_lock.release()
+
+
+def build_registry(documents=KNOWLEDGE_DOCUMENTS, manifest_url=KB_MANIFEST_URL):
+    registry = KnowledgeRegistry(manifest_url)
+    for name, entry in documents.items():
+        registry.register_versioned(name, entry["path"], entry["version"], entry["intents"])
+    return registry
+
+
+# Shared registry used by the handlers
+KNOWLEDGE_REGISTRY = build_registry()
@@ -0,0 +1,81 @@
+"""Keyset-paginated streaming over large time-series RPC results.
+
+``iter_rpc_batches`` yields pages of at most ``page_size`` rows ordered by
+time. Each page asks for rows at or after the last time seen, using
+PostgREST filters on the RPC:
+
+    client.rpc(fn, params).gte("time", last).order("time").range(skip, skip + page_size - 1)
+
+``skip`` is the number of rows at exactly ``last`` that were already
+yielded, so pages neither overlap nor depend on a growing OFFSET. Callers
+consume rows as a stream, so memory stays at one page however wide the
+window is. ``HourlyProfile`` is a streaming reducer for model features.
+"""
+from common.rolling_buffer import parse_time
+from common.schedule import JST
+
+PAGE_SIZE = 1000
+
+
+def iter_rpc_batches(client, function_name, params=None, page_size=PAGE_SIZE, time_key="time"):
+    last = None
+    at_last = 0
+    while True:
+        query = client.rpc(function_name, params)
+        if last is not None:
+            query = query.gte(time_key, last)
+        rows = query.order(time_key).range(at_last, at_last + page_size - 1).execute().data or []
+        if not rows:
+            return
+        yield rows
+        if len(rows) < page_size:
+            return
+
+        newest = rows[-1][time_key]
+        if newest == last:
+            at_last += len(rows)
+        else:
+            last = newest
+            at_last = sum(1 for row in rows if row[time_key] == newest)
+
+
+def iter_rpc_rows(client, function_name, params=None, page_size=PAGE_SIZE, time_key="time"):
+    for batch in iter_rpc_batches(client, function_name, params, page_size, time_key):
+        yield from batch
+
+
+class HourlyProfile:
+    """Mean count per JST (weekday, hour) built from a row stream in O(168) memory."""
+
+    def __init__(self, value_key="num", time_key="time"):
+        self.value_key = value_key
+        self.time_key = time_key
+        self.sums = {}
+        self.counts = {}
+        self.rows = 0
+
+    def add(self, row):
+        value = row.get(self.value_key)
+        if value is None:
+            return
+        at = parse_time(row[self.time_key])
+        if at.tzinfo is not None:
+            at = at.astimezone(JST)
+        key = (at.weekday(), at.hour)
+        self.sums[key] = self.sums.get(key, 0) + value
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.rows += 1
+
+    def consume(self, rows):
+        for row in rows:
+            self.add(row)
+        return self
+
+    def mean(self, weekday, hour):
+        count = self.counts.get((weekday, hour))
+        return self.sums[(weekday, hour)] / count if count else None
+
+    def format_lines(self):
+        weekdays = "月火水木金土日"
+        return [f"• {weekdays[weekday]} {hour:02d}時: 平均 {self.sums[(weekday, hour)] / count:.1f}人"
+                for (weekday, hour), count in sorted(self.counts.items())]
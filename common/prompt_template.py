@@ -0,0 +1,149 @@
+"""Prompt templates compiled once into static and dynamic segments.
+
+A ``PromptTemplate`` parses its ``{field}`` placeholders a single time. Fields
+named in ``static`` hold text that rarely changes (guidelines, zone list,
+document text): the literal text and static fields between two dynamic fields
+are joined into one string, memoized by the content hash of the static
+values, so a request only renders and concatenates its dynamic sections.
+
+``static_section`` memoizes the rendering of a slow-changing data section
+(rows -> prompt text) by the content hash of its rows, so unchanged rows are
+not formatted again on warm invocations.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from string import Formatter
+
+MEMO_MAX_ENTRIES = 32
+
+
+class _Memo:
+    """Small thread-safe LRU map of content hash -> rendered value."""
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+def content_hash(*values):
+    digest = hashlib.sha256()
+    for value in values:
+        data = value if isinstance(value, str) else json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+        digest.update(data.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class PromptTemplate:
+    def __init__(self, text, static=()):
+        self.static = tuple(static)
+        # Alternating literal strings and field names, in template order
+        self._segments = []
+        self.fields = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if spec or conversion:
+                raise ValueError(f"Format specs are not supported in prompt templates: {{{field}}}")
+            if literal:
+                self._segments.append(("literal", literal))
+            if field is not None:
+                self._segments.append(("field", field))
+                if field not in self.fields:
+                    self.fields.append(field)
+        self.literal = "".join(value for kind, value in self._segments if kind == "literal")
+        unknown = set(self.static) - set(self.fields)
+        if unknown:
+            raise ValueError(f"Static fields not in template: {sorted(unknown)}")
+        # Dynamic field occurrences in order; the static runs go between them
+        self.dynamic = [value for kind, value in self._segments if kind == "field" and value not in self.static]
+        self._memo = _Memo()
+        self._last = None
+
+    def _static_runs(self, static_values):
+        """Pre-joined text around the dynamic fields (one more run than fields)."""
+        values = tuple(static_values[name] for name in self.static)
+        # Sections from static_section come back as the very same str objects
+        last = self._last
+        if last is not None and len(last[0]) == len(values) and all(a is b for a, b in zip(last[0], values)):
+            self._memo.hits += 1
+            return last[1]
+        key = content_hash(*values)
+        runs = self._memo.get(key)
+        if runs is not None:
+            self._last = (values, runs)
+            return runs
+        runs = []
+        run = []
+        for kind, value in self._segments:
+            if kind == "literal":
+                run.append(value)
+            elif value in static_values:
+                run.append(static_values[value])
+            else:
+                runs.append("".join(run))
+                run = []
+        runs.append("".join(run))
+        runs = tuple(runs)
+        self._memo.set(key, runs)
+        self._last = (values, runs)
+        return runs
+
+    def render(self, **values):
+        missing = [name for name in self.fields if name not in values]
+        if missing:
+            raise KeyError(f"Missing prompt fields: {missing}")
+        runs = self._static_runs({name: values[name] if isinstance(values[name], str) else str(values[name])
+                                  for name in self.static})
+        out = [runs[0]]
+        for name, run in zip(self.dynamic, runs[1:]):
+            out.append(str(values[name]))
+            out.append(run)
+        return "".join(out)
+
+    def memo_stats(self):
+        return {"hits": self._memo.hits, "misses": self._memo.misses}
+
+
+_sections = _Memo(max_entries=MEMO_MAX_ENTRIES * 4)
+# name -> (rows object, text) of the last render, to skip hashing the same object
+_last_render = {}
+
+
+def static_section(name, rows, render):
+    """``render(rows)``, memoized by the content hash of ``rows``.
+
+    Rows served from ``common.rpc_cache`` are the same (never mutated) object
+    on every warm invocation, so an identical object is answered without
+    hashing; other rows are hashed.
+    """
+    last = _last_render.get(name)
+    if last is not None and last[0] is rows:
+        return last[1]
+    key = (name, content_hash(rows))
+    text = _sections.get(key)
+    if text is None:
+        text = render(rows)
+        _sections.set(key, text)
+    _last_render[name] = (rows, text)
+    return text
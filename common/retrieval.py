@@ -0,0 +1,122 @@
+"""Chunk index with BM25 retrieval over the knowledge-base PDF text.
+
+Instead of pasting a whole PDF into every prompt, the text is split into
+section-sized chunks and only the chunks most relevant to the question are
+sent. Japanese has no word boundaries, so CJK runs are tokenized into
+character bigrams while Latin words and numbers stay whole tokens.
+"""
+import math
+import re
+from collections import Counter
+
+DEFAULT_TOP_K = 3
+DEFAULT_CHUNK_CHARS = 600
+
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+|[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uff66-\uff9f]+")
+_LATIN_RE = re.compile(r"[A-Za-z0-9]+")
+
+# text -> BM25Index, so each PDF text is indexed once per container. Hot
+# reloads bring new versions, so only the newest few are kept
+_indexes = {}
+MAX_INDEXES = 4
+
+
+def tokenize(text):
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if _LATIN_RE.fullmatch(run):
+            tokens.append(run.lower())
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def split_into_chunks(text, max_chars=DEFAULT_CHUNK_CHARS):
+    """Split text into chunks of whole lines, breaking at blank lines first.
+
+    A blank line closes the current section; otherwise lines are packed into
+    a chunk until ``max_chars`` is reached.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            if current:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            continue
+        if current and size + len(line) > max_chars:
+            chunks.append("\n".join(current))
+            current, size = [], 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class BM25Index:
+    """Okapi BM25 over a fixed list of chunks."""
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        doc_freq = Counter()
+        for tf in self.term_freqs:
+            doc_freq.update(tf.keys())
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+    def scores(self, query):
+        query_terms = [t for t in set(tokenize(query)) if t in self.idf]
+        scores = [0.0] * len(self.chunks)
+        if not query_terms or not self.avg_length:
+            return scores
+        for i, tf in enumerate(self.term_freqs):
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+            score = 0.0
+            for term in query_terms:
+                freq = tf.get(term)
+                if freq:
+                    score += self.idf[term] * freq * (self.k1 + 1) / (freq + norm)
+            scores[i] = score
+        return scores
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        """Return up to ``top_k`` (chunk_no, score) pairs with a positive score."""
+        scored = [(i, s) for i, s in enumerate(self.scores(query)) if s > 0]
+        scored.sort(key=lambda item: item[1], reverse=True)
+        return scored[:top_k]
+
+
+def get_index(text):
+    index = _indexes.get(text)
+    if index is None:
+        index = BM25Index(split_into_chunks(text))
+        _indexes[text] = index
+        while len(_indexes) > MAX_INDEXES:
+            _indexes.pop(next(iter(_indexes)), None)
+    return index
+
+
+def retrieve_relevant_text(question, text, top_k=DEFAULT_TOP_K):
+    """Return the ``top_k`` chunks of ``text`` most relevant to ``question``.
+
+    Chunks are returned in document order. When nothing in the question
+    matches, the opening chunks are used so the prompt still gets an overview.
+    """
+    if not text:
+        return ""
+    index = get_index(text)
+    hits = index.search(question, top_k)
+    chunk_nos = sorted(i for i, _ in hits) if hits else range(min(top_k, len(index.chunks)))
+    return "\n...\n".join(index.chunks[i] for i in chunk_nos)
@@ -0,0 +1,103 @@
+"""Rolling in-memory buffer of the last week of 3rd-floor counts.
+
+The buffer is seeded once with the full ``get_last_week_data`` result.
+After that each refresh asks only for rows newer than its high-water mark,
+using PostgREST filters on the same RPC:
+
+    client.rpc("get_last_week_data").gt("time", high_water_mark).order("time")
+
+so a warm container transfers a few seconds of rows per request instead of
+a full week. Rows older than ``window`` before the newest row are evicted.
+The buffer re-seeds in full every ``reseed_seconds`` to pick up rows that
+were written late or corrected.
+"""
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+WINDOW = timedelta(days=7)
+RESEED_SECONDS = 6 * 60 * 60
+
+
+def parse_time(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class RollingBuffer:
+    def __init__(self, client, function_name="get_last_week_data", time_key="time",
+                 window=WINDOW, reseed_seconds=RESEED_SECONDS, clock=time.monotonic):
+        self.client = client
+        self.function_name = function_name
+        self.time_key = time_key
+        self.window = window
+        self.reseed_seconds = reseed_seconds
+        self._clock = clock
+        self._rows = deque()
+        self._times = deque()
+        self._high_water_mark = None
+        self._seeded_at = None
+        self._lock = threading.Lock()
+        self.rows_fetched = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    @property
+    def high_water_mark(self):
+        return self._high_water_mark
+
+    def _seed(self):
+        rows = self.client.rpc(self.function_name).execute().data or []
+        rows = sorted(rows, key=lambda row: parse_time(row[self.time_key]))
+        self._rows = deque(rows)
+        self._times = deque(parse_time(row[self.time_key]) for row in rows)
+        self._high_water_mark = self._rows[-1][self.time_key] if rows else None
+        self._seeded_at = self._clock()
+        self.rows_fetched += len(rows)
+
+    def _fetch_since(self):
+        rows = (self.client.rpc(self.function_name)
+                .gt(self.time_key, self._high_water_mark)
+                .order(self.time_key)
+                .execute().data) or []
+        self.rows_fetched += len(rows)
+        newest = self._times[-1]
+        for row in rows:
+            row_time = parse_time(row[self.time_key])
+            if row_time <= newest:
+                continue
+            self._rows.append(row)
+            self._times.append(row_time)
+            newest = row_time
+        if self._rows:
+            self._high_water_mark = self._rows[-1][self.time_key]
+
+    def _evict(self):
+        if not self._times:
+            return
+        cutoff = self._times[-1] - self.window
+        while self._times and self._times[0] < cutoff:
+            self._times.popleft()
+            self._rows.popleft()
+
+    def refresh(self):
+        """Bring the buffer up to date; returns the number of rows fetched."""
+        with self._lock:
+            before = self.rows_fetched
+            due = self._seeded_at is None or self._clock() - self._seeded_at >= self.reseed_seconds
+            if due or self._high_water_mark is None:
+                self._seed()
+            else:
+                self._fetch_since()
+            self._evict()
+            return self.rows_fetched - before
+
+    def rows(self, refresh=True):
+        """Rows of the last ``window``, oldest first."""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return list(self._rows)
@@ -0,0 +1,123 @@
+"""In-process TTL cache for Supabase RPC results.
+
+Lives at module level, so it survives across warm Lambda invocations. Each
+RPC has its own freshness window: zones barely change, weather forecasts
+change hourly and the current count every few seconds. Entries are evicted
+least-recently-used once ``RPC_CACHE_MAX_ENTRIES`` is reached, and hit/miss
+counters are kept for logging.
+
+Separately, the last good result of every RPC is kept for up to
+``STALE_MAX_AGE_SECONDS`` so a failing source can be answered with a stale
+copy (see ``get_last_good``).
+
+Cached rows are shared between invocations; callers must not mutate them.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# rpc name -> seconds a result stays fresh; RPCs not listed are never cached
+RPC_TTL_SECONDS = {
+    "get_thirdfloor_zones": 24 * 60 * 60,
+    "get_weather_data_for_next_days": 15 * 60,
+    "get_last_week_data": 5 * 60,
+    "get_current_time_data": 5,
+}
+
+RPC_CACHE_MAX_ENTRIES = int(os.getenv("RPC_CACHE_MAX_ENTRIES", "64"))
+STALE_MAX_AGE_SECONDS = float(os.getenv("STALE_MAX_AGE_SECONDS", str(24 * 60 * 60)))
+
+
+def cache_key(function_name, params=None):
+    return function_name, json.dumps(params or {}, sort_keys=True, default=str)
+
+
+class TTLCache:
+    """Size-bounded LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_entries=RPC_CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value, or None when missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= self._clock():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Shared caches used by common.data_access
+RPC_CACHE = TTLCache()
+LAST_GOOD = TTLCache()
+
+
+def get_cached(function_name, params=None):
+    if function_name not in RPC_TTL_SECONDS:
+        return None
+    return RPC_CACHE.get(cache_key(function_name, params))
+
+
+def store(function_name, params, rows):
+    """Cache ``rows`` if the RPC has a TTL; empty results are not cached."""
+    if not rows:
+        return
+    key = cache_key(function_name, params)
+    ttl = RPC_TTL_SECONDS.get(function_name)
+    if ttl:
+        RPC_CACHE.set(key, rows, ttl)
+    LAST_GOOD.set(key, (time.time(), rows), STALE_MAX_AGE_SECONDS)
+
+
+def get_last_good(function_name, params=None):
+    """(rows, age in seconds) of the last good result, or None."""
+    entry = LAST_GOOD.get(cache_key(function_name, params))
+    if entry is None:
+        return None
+    stored_at, rows = entry
+    return rows, time.time() - stored_at
+
+
+def cache_stats():
+    return RPC_CACHE.stats()
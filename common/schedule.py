@@ -0,0 +1,265 @@
+"""Parse the minohc schedule PDF text into a date-indexed schedule table.
+
+Each schedule line becomes a ``ScheduleRow`` (date, period, start, end,
+event type). Rows are kept sorted by start time, so "what is on today" and
+"what is happening in the next 30 minutes" are bisect lookups instead of
+asking Claude to read the raw schedule text. All times are naive JST.
+"""
+import re
+from bisect import bisect_left
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta, timezone
+
+JST = timezone(timedelta(hours=9))
+
+# Osaka University class periods
+PERIOD_TIMES = {
+    1: (time(8, 50), time(10, 20)),
+    2: (time(10, 30), time(12, 0)),
+    3: (time(13, 30), time(15, 0)),
+    4: (time(15, 10), time(16, 40)),
+    5: (time(16, 50), time(18, 20)),
+    6: (time(18, 30), time(20, 0)),
+}
+
+# Checked in order, first keyword found wins
+EVENT_KEYWORDS = [
+    ("休講", "cancelled"),
+    ("補講", "makeup_class"),
+    ("試験", "exam"),
+    ("休業", "holiday"),
+    ("休日", "holiday"),
+    ("祝日", "holiday"),
+    ("休み", "holiday"),
+    ("授業", "class"),
+    ("講義", "class"),
+    ("祭", "event"),
+    ("説明会", "event"),
+    ("式", "event"),
+    ("イベント", "event"),
+]
+
+MAX_RANGE_DAYS = 62
+# Schedules run April to March
+ACADEMIC_YEAR_START_MONTH = 4
+
+ScheduleRow = namedtuple("ScheduleRow", ["date", "period", "start", "end", "event_type", "description"])
+
+_DATE_RE = re.compile(r"(?:(\d{4})\s*[年/.\-]\s*)?(\d{1,2})\s*[月/.\-]\s*(\d{1,2})\s*日?")
+_RANGE_SEP_RE = re.compile(r"^\s*(?:\([^)]*\)|（[^）]*）)?\s*[~～〜\-－–]\s*$")
+_TIME_RANGE_RE = re.compile(r"(\d{1,2})[:：](\d{2})\s*[~～〜\-－–]\s*(\d{1,2})[:：](\d{2})")
+_PERIOD_RE = re.compile(r"第?\s*(\d)\s*(?:[~～〜\-－–・]\s*(\d)\s*)?時?限")
+
+# (text, academic year) -> ScheduleTable, so each schedule is parsed once per
+# container. Hot reloads bring new versions, so only the newest few are kept
+_tables = {}
+MAX_TABLES = 4
+
+
+def _event_type(line, has_period):
+    for keyword, event_type in EVENT_KEYWORDS:
+        if keyword in line:
+            return event_type
+    return "class" if has_period else "other"
+
+
+def _blank(match):
+    return " " * len(match.group(0))
+
+
+def _dates_in_line(line, default_year, last_month):
+    """Return (dates, year, month) found in ``line``, expanding A～B ranges."""
+    # Blank out time and period ranges first so "13:00-14:30" and "1-2限" are not read as dates
+    line = _PERIOD_RE.sub(_blank, _TIME_RANGE_RE.sub(_blank, line))
+    matches = [m for m in _DATE_RE.finditer(line) if 1 <= int(m.group(2)) <= 12]
+    dates = []
+    year = default_year
+    for m in matches:
+        month, day = int(m.group(2)), int(m.group(3))
+        if m.group(1):
+            year = int(m.group(1))
+        elif last_month and month < last_month:
+            # Schedules run April to March, so a smaller month means a new year
+            year += 1
+        elif not last_month and month < ACADEMIC_YEAR_START_MONTH:
+            # A schedule starting in January-March is in the academic year's second calendar year
+            year += 1
+        last_month = month
+        try:
+            dates.append(date(year, month, day))
+        except ValueError:
+            continue
+
+    if len(matches) == 2 and len(dates) == 2 and _RANGE_SEP_RE.match(line[matches[0].end():matches[1].start()]):
+        first, last = dates
+        if first < last and (last - first).days <= MAX_RANGE_DAYS:
+            dates = [first + timedelta(days=i) for i in range((last - first).days + 1)]
+    return dates, year, last_month
+
+
+def academic_year(at=None):
+    """The April-to-March academic year ``at`` (default: now, JST) falls in."""
+    at = at or datetime.now(JST)
+    return at.year if at.month >= ACADEMIC_YEAR_START_MONTH else at.year - 1
+
+
+def parse_schedule(text, year=None):
+    """Parse schedule text into a sorted list of ``ScheduleRow``.
+
+    Lines carrying a period or time range but no date inherit the last date
+    seen, which is how the PDF tables list several slots under one day. Dates
+    without a year belong to the academic year ``year`` (default: the current
+    JST one): April to December in ``year``, January to March in ``year + 1``.
+    """
+    current_year = year or academic_year()
+    last_month = None
+    last_dates = []
+    rows = []
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        dates, current_year, last_month = _dates_in_line(line, current_year, last_month)
+        time_match = _TIME_RANGE_RE.search(line)
+        period_match = _PERIOD_RE.search(line)
+        if not dates:
+            if not (time_match or period_match) or not last_dates:
+                continue
+            dates = last_dates
+        last_dates = dates
+
+        period = None
+        if time_match:
+            start_t = time(int(time_match.group(1)) % 24, int(time_match.group(2)))
+            end_t = time(int(time_match.group(3)) % 24, int(time_match.group(4)))
+        elif period_match and int(period_match.group(1)) in PERIOD_TIMES:
+            period = int(period_match.group(1))
+            last_period = int(period_match.group(2) or period)
+            start_t = PERIOD_TIMES[period][0]
+            end_t = PERIOD_TIMES.get(last_period, PERIOD_TIMES[period])[1]
+        else:
+            start_t = end_t = None
+        if period is None and period_match:
+            period = int(period_match.group(1))
+
+        event_type = _event_type(line, period_match is not None)
+        for day in dates:
+            if start_t is None:
+                start = datetime.combine(day, time(0, 0))
+                end = start + timedelta(days=1)
+            else:
+                start = datetime.combine(day, start_t)
+                end = datetime.combine(day, end_t)
+                if end <= start:
+                    end += timedelta(days=1)
+            rows.append(ScheduleRow(day, period, start, end, event_type, line))
+
+    rows.sort(key=lambda row: (row.start, row.end))
+    return rows
+
+
+class ScheduleTable:
+    """Schedule rows with a sorted start-time index for bisect lookups."""
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row.start, row.end))
+        self.starts = [row.start for row in self.rows]
+        self.max_duration = max((row.end - row.start for row in self.rows), default=timedelta(0))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def rows_on(self, day):
+        """Rows starting on ``day``."""
+        day_start = datetime.combine(day, time(0, 0))
+        lo = bisect_left(self.starts, day_start)
+        hi = bisect_left(self.starts, day_start + timedelta(days=1))
+        return self.rows[lo:hi]
+
+    def rows_between(self, start, end):
+        """Rows overlapping [start, end).
+
+        No row is longer than ``max_duration``, so only rows starting after
+        ``start - max_duration`` need to be looked at.
+        """
+        lo = bisect_left(self.starts, start - self.max_duration)
+        hi = bisect_left(self.starts, end)
+        return [row for row in self.rows[lo:hi] if row.end > start]
+
+    def upcoming(self, at, minutes=30):
+        """Rows in progress at ``at`` or starting within ``minutes`` of it."""
+        return self.rows_between(at, at + timedelta(minutes=minutes))
+
+    def next_start_after(self, at):
+        i = bisect_left(self.starts, at)
+        return self.rows[i] if i < len(self.rows) else None
+
+
+def get_schedule_table(text, year=None):
+    # Keyed by year too, so a warm container picks up the new academic year in April
+    key = (text, year or academic_year())
+    table = _tables.get(key)
+    if table is None:
+        table = ScheduleTable(parse_schedule(text, key[1]))
+        _tables[key] = table
+        while len(_tables) > MAX_TABLES:
+            _tables.pop(next(iter(_tables)), None)
+    return table
+
+
+def _to_jst_naive(at):
+    if at is None:
+        at = datetime.now(JST)
+    if at.tzinfo is not None:
+        at = at.astimezone(JST).replace(tzinfo=None)
+    return at
+
+
+def schedule_features(table, at=None, minutes=30):
+    """Numeric schedule features at ``at`` for the prediction model."""
+    at = _to_jst_naive(at)
+    today = table.rows_on(at.date())
+    window = table.upcoming(at, minutes)
+    next_row = table.next_start_after(at)
+    return {
+        "classes_in_window": sum(1 for row in window if row.event_type in ("class", "makeup_class", "exam")),
+        "events_in_window": sum(1 for row in window if row.event_type == "event"),
+        "rows_today": len(today),
+        "is_holiday": any(row.event_type == "holiday" for row in today),
+        "minutes_until_next_start": int((next_row.start - at).total_seconds() // 60) if next_row else None,
+    }
+
+
+def format_schedule_rows(rows):
+    lines = []
+    for row in rows:
+        period = f" {row.period}限" if row.period else ""
+        if row.end - row.start >= timedelta(days=1):
+            when = "終日"
+        else:
+            when = f"{row.start:%H:%M}-{row.end:%H:%M}"
+        lines.append(f"• {row.date:%Y/%m/%d}{period} {when} {row.event_type}: {row.description}")
+    return "\n".join(lines)
+
+
+def format_schedule_context(table, at=None, minutes=30):
+    """Prompt section with today's rows, the rows around ``at`` and features.
+
+    Returns an empty string when the schedule could not be parsed, so callers
+    can fall back to retrieval over the raw text.
+    """
+    if not len(table):
+        return ""
+    at = _to_jst_naive(at)
+    window = table.upcoming(at, minutes)
+    today = [row for row in table.rows_on(at.date()) if row not in window]
+    features = schedule_features(table, at, minutes)
+    return "\n".join([
+        f"{at:%Y/%m/%d %H:%M} から{minutes}分以内の予定:",
+        format_schedule_rows(window) or "• なし",
+        "本日のその他の予定:",
+        format_schedule_rows(today) or "• なし",
+        "スケジュール特徴量: " + ", ".join(f"{key}={value}" for key, value in features.items()),
+    ])
@@ -0,0 +1,129 @@
+"""Compact tabular encoding of context rows for the prompts.
+
+Rendering rows as ``label: value, label: value`` repeats every field name on
+every row, which for the weather and zone datasets costs more tokens than the
+values. ``encode_table`` writes the column names once as a header row and
+each row as delimiter-separated values. With ``run_column`` set, consecutive
+rows equal in every other column (e.g. an unchanged people count) collapse
+into one row whose ``run_column`` cell is the range ``first〜last``;
+``encode_counts`` does this for people-count rows.
+
+``format_data_for_claude`` is the shared version of the per-handler
+formatter, keyed by data type. Zones go through
+``common.zone_summary.format_zone_summary`` so no raw polygon reaches a prompt.
+"""
+DELIMITER = "|"
+MISSING = "-"
+RUN_SEPARATOR = "〜"
+
+WEATHER_COLUMNS = ["weather_time", "temperature_2m_celsius", "relative_humidity_2m_percent",
+                   "apparent_temperature_celsius", "precipitation_mm", "snowfall_cm", "weather_code_wmo_code",
+                   "cloud_cover_percent", "wind_speed_10m_kmh"]
+# No "geometry": zones are sent as common.zone_summary summaries, never as raw polygons
+ZONE_COLUMNS = ["zone_id", "zone_no", "zone_name", "count_type", "capacity"]
+
+# data_type -> (section title, columns, run column). Runs are collapsed only
+# for count time series; suspicious rows are separate events and stay one per row
+TABLES = {
+    "suspicious": ("不審者", ["event_time", "num"], None),
+    "project_times": ("入り帰りデータ", ["start_time", "last_time"], None),
+    "max_min": ("最大最小データ", ["max_time", "max_num", "min_time", "min_num"], None),
+    "current_data": ("現在データ", ["time", "num"], "time"),
+    "interval": ("人流データ", ["time", "num"], "time"),
+    "last_week": ("過去データ", ["time", "num"], "time"),
+    "prediction": ("予想データ", ["time", "num", "reasons"], None),
+    "weather": ("気候データ", WEATHER_COLUMNS, None),
+    "zones": ("ゾーンデータ", ZONE_COLUMNS, None),
+}
+
+
+def _cell(value, delimiter):
+    if value is None:
+        return MISSING
+    text = str(value)
+    if delimiter in text or "\n" in text:
+        text = text.replace(delimiter, "/").replace("\n", " ")
+    return text
+
+
+def encode_table(rows, columns=None, delimiter=DELIMITER, run_column=None):
+    """Header row plus one ``delimiter``-separated line per row.
+
+    ``columns`` defaults to the keys of the first row. Missing values are
+    written as ``MISSING``.
+    """
+    if isinstance(rows, dict):
+        rows = [rows]
+    if not rows:
+        return ""
+    columns = list(columns or rows[0].keys())
+    lines = [delimiter.join(columns)]
+    if run_column is None or run_column not in columns:
+        for row in rows:
+            lines.append(delimiter.join([_cell(row.get(column), delimiter) for column in columns]))
+        return "\n".join(lines)
+
+    run_index = columns.index(run_column)
+    others = [column for column in columns if column != run_column]
+    run_start = run_end = None
+    run_values = None
+    for row in rows:
+        values = [_cell(row.get(column), delimiter) for column in others]
+        if values == run_values:
+            run_end = row.get(run_column)
+            continue
+        if run_values is not None:
+            lines.append(_run_line(run_start, run_end, run_values, run_index, delimiter))
+        run_start = run_end = row.get(run_column)
+        run_values = values
+    lines.append(_run_line(run_start, run_end, run_values, run_index, delimiter))
+    return "\n".join(lines)
+
+
+def encode_counts(rows, time_key="time", value_key="num"):
+    """People-count rows as a table, with runs of an unchanged count collapsed.
+
+    Same output as ``encode_table(rows, [time_key, value_key],
+    run_column=time_key)``, specialised for the long count datasets.
+    """
+    if not rows:
+        return ""
+    lines = [f"{time_key}{DELIMITER}{value_key}"]
+    start = end = rows[0][time_key]
+    current = rows[0].get(value_key)
+    for row in rows:
+        value = row.get(value_key)
+        if value == current:
+            end = row[time_key]
+            continue
+        lines.append(f"{start}{DELIMITER}{MISSING if current is None else current}" if start == end
+                     else f"{start}{RUN_SEPARATOR}{end}{DELIMITER}{MISSING if current is None else current}")
+        start = end = row[time_key]
+        current = value
+    lines.append(f"{start}{DELIMITER}{MISSING if current is None else current}" if start == end
+                 else f"{start}{RUN_SEPARATOR}{end}{DELIMITER}{MISSING if current is None else current}")
+    return "\n".join(lines)
+
+
+def _run_line(start, end, values, run_index, delimiter):
+    span = _cell(start, delimiter) if start == end else f"{_cell(start, delimiter)}{RUN_SEPARATOR}{_cell(end, delimiter)}"
+    return delimiter.join(values[:run_index] + [span] + values[run_index:])
+
+
+def format_data_for_claude(data, data_type, prediction_data=None):
+    """Context section for ``data_type`` (see ``TABLES``).
+
+    ``"all"`` (or any dict of data types) renders every known section it
+    holds. ``prediction_data`` is used for the prediction section when
+    ``data`` is empty.
+    """
+    if data_type == "all" or (isinstance(data, dict) and data_type not in TABLES):
+        return "\n".join(format_data_for_claude(rows, key) for key, rows in (data or {}).items() if key in TABLES)
+    if data_type == "prediction" and not data:
+        data = prediction_data
+    title, columns, run_column = TABLES[data_type]
+    if data_type == "zones":
+        # Imported here because common.zone_summary builds on this module
+        from common.zone_summary import format_zone_summary
+        return f"\n{title}:\n" + format_zone_summary(data)
+    return f"\n{title}:\n" + encode_table(data or [], columns, run_column=run_column)
@@ -0,0 +1,187 @@
+"""Write-behind queue for rows the handlers insert into Supabase.
+
+``enqueue`` writes the row to a local spool (one fsynced JSON file per row
+under ``WRITE_SPOOL_DIR``). When the spool is on durable storage (a mounted
+volume such as EFS) it returns at once, so the request does not wait for the
+database, and a background thread inserts spooled rows in bulk once
+``batch_size`` rows are waiting or the oldest has waited ``flush_seconds``.
+A row's file is deleted only after its insert succeeded, and failed batches
+are retried with backoff; a queue created on an existing spool (cold start on
+a shared volume) picks the rows up again.
+
+A Lambda container is frozen right after the response and ``/tmp`` goes with
+it when it is reclaimed, so on a spool under ``/tmp`` ``enqueue`` inserts the
+row before returning instead; the spool then only holds rows whose insert
+failed, until a retry succeeds.
+
+Delivery is at-least-once, so every row gets a client-generated
+``ID_COLUMN`` and is written with ``upsert(on_conflict=ID_COLUMN)``: a batch
+re-sent after its insert succeeded does not duplicate rows. The table needs
+that column with a unique constraint, e.g.
+
+    alter table predictiondata add column write_id uuid unique;
+
+Until that migration has run, the upsert fails on the missing column or
+constraint; the queue then switches to plain inserts without ``ID_COLUMN``
+(rows are saved as before, but a re-sent batch can duplicate them).
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+
+WRITE_SPOOL_DIR = os.getenv("WRITE_SPOOL_DIR", "/tmp/write_spool")
+# Client-generated idempotency key added to every row
+ID_COLUMN = os.getenv("WRITE_ID_COLUMN", "write_id")
+BATCH_SIZE = 50
+FLUSH_SECONDS = 2.0
+MAX_BACKOFF_SECONDS = 60.0
+
+
+class WriteBehindQueue:
+    def __init__(self, client, table, spool_dir=None, batch_size=BATCH_SIZE, flush_seconds=FLUSH_SECONDS, durable=None):
+        self.client = client
+        self.table = table
+        self.spool_dir = os.path.join(spool_dir or WRITE_SPOOL_DIR, table)
+        # Only a spool outside /tmp survives the container; otherwise write synchronously
+        self.durable = is_durable(self.spool_dir) if durable is None else durable
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._wake = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._backoff = 0.0
+        self.rows_written = 0
+        self.failed_flushes = 0
+        # Cleared once the table turns out to have no unique ID_COLUMN
+        self.idempotent = True
+        atexit.register(self.flush)
+        if self._pending():
+            # Rows left behind by an earlier process
+            self._ensure_thread()
+
+    def _pending(self):
+        """Spooled row files, oldest first."""
+        return sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".json"))
+
+    def pending_count(self):
+        return len(self._pending())
+
+    def enqueue(self, row):
+        """Spool ``row`` and schedule it for a bulk insert.
+
+        On a non-durable spool the row is inserted before returning. Returns
+        False when that insert failed and the row is only held in the spool
+        for a retry.
+        """
+        write_id = row.get(ID_COLUMN) or str(uuid.uuid4())
+        row = dict(row, **{ID_COLUMN: write_id})
+        # Time-prefixed names keep the spool in arrival order
+        name = f"{time.time_ns():020d}-{write_id}.json"
+        tmp_path = os.path.join(self.spool_dir, name + ".part")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(row, f, ensure_ascii=False, default=str)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.spool_dir, name))
+        self._ensure_thread()
+        if not self.durable:
+            self.flush()
+            if os.path.exists(os.path.join(self.spool_dir, name)):
+                print(f"ERROR: row {write_id} for {self.table} is only in the non-durable spool "
+                      f"{self.spool_dir}; it is lost if this container is reclaimed before a retry succeeds")
+                return False
+            return True
+        if self.pending_count() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self, max_batches=None):
+        """Insert spooled rows in bulk now; returns the number written."""
+        written = 0
+        batches = 0
+        with self._flush_lock:
+            while max_batches is None or batches < max_batches:
+                names = self._pending()[:self.batch_size]
+                if not names:
+                    break
+                rows = []
+                for name in names:
+                    try:
+                        with open(os.path.join(self.spool_dir, name), encoding="utf-8") as f:
+                            rows.append(json.load(f))
+                    except (OSError, ValueError) as e:
+                        print(f"Dropping unreadable spooled row {name}: {str(e)}")
+                        os.remove(os.path.join(self.spool_dir, name))
+                        rows.append(None)
+                rows_to_insert = [row for row in rows if row is not None]
+                if rows_to_insert:
+                    try:
+                        self._write(rows_to_insert)
+                    except Exception as e:
+                        self.failed_flushes += 1
+                        self._backoff = min(max(self._backoff * 2, 1.0), MAX_BACKOFF_SECONDS)
+                        print(f"Bulk insert into {self.table} failed, {len(rows_to_insert)} rows kept for retry: {str(e)}")
+                        break
+                for name, row in zip(names, rows):
+                    if row is not None:
+                        os.remove(os.path.join(self.spool_dir, name))
+                self._backoff = 0.0
+                written += len(rows_to_insert)
+                batches += 1
+        if written:
+            self.rows_written += written
+            print(f"Inserted {written} rows into {self.table}")
+        return written
+
+    def _write(self, rows):
+        if self.idempotent:
+            try:
+                self.client.table(self.table).upsert(rows, on_conflict=ID_COLUMN, ignore_duplicates=True).execute()
+                return
+            except Exception as e:
+                if not _is_missing_id_column(e):
+                    raise
+                self.idempotent = False
+                print(f"{self.table} has no unique {ID_COLUMN} column, using plain inserts "
+                      f"(retried batches may duplicate rows): {str(e)}")
+        self.client.table(self.table).insert([{k: v for k, v in row.items() if k != ID_COLUMN} for row in rows]).execute()
+
+    def _oldest_age(self):
+        names = self._pending()
+        if not names:
+            return None
+        return time.time() - int(names[0].split("-", 1)[0]) / 1e9
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=max(self.flush_seconds, self._backoff))
+            self._wake.clear()
+            age = self._oldest_age()
+            if age is None:
+                continue
+            if self.pending_count() >= self.batch_size or age >= self.flush_seconds:
+                self.flush()
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.table}", daemon=True)
+            self._thread.start()
+
+
+def _is_missing_id_column(error):
+    # PostgREST answers PGRST204 for an unknown column; Postgres 42P10 when
+    # no unique constraint matches the ON CONFLICT target
+    return (getattr(error, "code", None) in ("PGRST204", "42P10")
+            or f"'{ID_COLUMN}' column" in str(error)
+            or "ON CONFLICT specification" in str(error))
+
+
+def is_durable(path):
+    """False for paths under /tmp, which Lambda discards with the container."""
+    real = os.path.realpath(path)
+    tmp = os.path.realpath("/tmp")
+    return real != tmp and not real.startswith(tmp + os.sep)
@@ -0,0 +1,318 @@
+"""Zone geometry parsed once into per-zone summaries for the prompts.
+
+``get_thirdfloor_zones`` returns each zone's polygon, and pasting those
+coordinates into every prompt costs many tokens for little value. A
+``ZoneIndex`` parses the geometries once and keeps, per zone, the area,
+centroid, capacity, count_type and the zones it borders (boundaries within
+``ADJACENCY_TOLERANCE``). Prompts carry only ``format_zone_summary`` while
+the parsed polygons stay available to spatial code via ``polygons``.
+
+Geometries may be GeoJSON (dict or string), WKT (optionally ``SRID=n;``
+prefixed) or hex (E)WKB, the forms PostGIS values take through PostgREST.
+Coordinates are taken as metres, except for SRID 4326 (lon/lat, and GeoJSON
+without a ``crs``), which is projected locally to metres for the area and
+adjacency; its centroid stays in lon/lat. Zones with an empty or unparseable
+geometry keep their other fields and have no area, centroid or neighbours. Indexes are cached by the content hash of the
+zone rows, which change rarely.
+"""
+import json
+import math
+import os
+import re
+import struct
+import threading
+
+from common.prompt_template import content_hash
+from common.tabular import encode_table
+
+ADJACENCY_TOLERANCE = float(os.getenv("ZONE_ADJACENCY_TOLERANCE", "0.5"))
+GEOGRAPHIC_SRIDS = {4326}
+
+ZONE_SUMMARY_COLUMNS = ["zone_id", "zone_no", "zone_name", "count_type", "capacity", "area_m2", "centroid", "adjacent"]
+
+_WKT_SRID_RE = re.compile(r"^\s*SRID=(\d+);", re.I)
+_WKT_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+# Parsing: every format ends up as (polygons, srid), where a polygon is a
+# list of rings and a ring a list of (x, y) tuples, the outer ring first
+
+def _wkt_rings(body):
+    rings = []
+    for ring_text in re.findall(r"\(([^()]*)\)", body):
+        numbers = [float(n) for n in _WKT_NUMBER_RE.findall(ring_text)]
+        # Only x and y are kept; Z/M values follow them in each tuple
+        dims = len(ring_text.split(",")[0].split())
+        rings.append([(numbers[i], numbers[i + 1]) for i in range(0, len(numbers), dims)])
+    return rings
+
+
+def _parse_wkt(text):
+    srid = None
+    match = _WKT_SRID_RE.match(text)
+    if match:
+        srid = int(match.group(1))
+        text = text[match.end():]
+    kind = text.strip().split("(", 1)[0].strip().upper()
+    if kind.startswith("MULTIPOLYGON"):
+        inner = text[text.index("(") + 1:text.rindex(")")]
+        return [_wkt_rings(part) for part in re.findall(r"\((\([^()]*\)(?:\s*,\s*\([^()]*\))*)\)", inner)], srid
+    if kind.startswith("POLYGON"):
+        return [_wkt_rings(text)], srid
+    raise ValueError(f"Unsupported WKT geometry: {kind}")
+
+
+def _parse_geojson(geometry):
+    # RFC 7946 GeoJSON is WGS84, and PostGIS omits crs for SRID 4326
+    srid = 4326
+    crs = (geometry.get("crs") or {}).get("properties", {}).get("name", "")
+    if crs:
+        digits = re.findall(r"(\d+)$", crs)
+        srid = int(digits[0]) if digits else srid
+    if geometry.get("type") == "Feature":
+        polygons, inner_srid = _parse_geojson(geometry["geometry"])
+        return polygons, srid if crs else inner_srid
+    coordinates = geometry.get("coordinates") or []
+    if geometry.get("type") == "Polygon":
+        polygons = [coordinates]
+    elif geometry.get("type") == "MultiPolygon":
+        polygons = coordinates
+    else:
+        raise ValueError(f"Unsupported GeoJSON geometry: {geometry.get('type')}")
+    return [[[(float(p[0]), float(p[1])) for p in ring] for ring in polygon] for polygon in polygons], srid
+
+
+def _parse_wkb(data):
+    polygons = []
+    srid = None
+
+    def read(offset):
+        nonlocal srid
+        order = "<" if data[offset] == 1 else ">"
+        (kind,) = struct.unpack_from(order + "I", data, offset + 1)
+        offset += 5
+        if kind & 0x20000000:
+            (srid,) = struct.unpack_from(order + "I", data, offset)
+            offset += 4
+        dims = 2 + bool(kind & 0x80000000) + bool(kind & 0x40000000)
+        base = kind & 0xFFFF
+        # ISO WKB encodes Z/M as +1000/+2000/+3000
+        dims += {1: 1, 2: 1, 3: 2}.get(base // 1000, 0)
+        base %= 1000
+        if base == 3:
+            (ring_count,) = struct.unpack_from(order + "I", data, offset)
+            offset += 4
+            rings = []
+            for _ in range(ring_count):
+                (point_count,) = struct.unpack_from(order + "I", data, offset)
+                offset += 4
+                values = struct.unpack_from(order + "d" * (point_count * dims), data, offset)
+                offset += 8 * point_count * dims
+                rings.append([(values[i], values[i + 1]) for i in range(0, len(values), dims)])
+            polygons.append(rings)
+            return offset
+        if base == 6:
+            (count,) = struct.unpack_from(order + "I", data, offset)
+            offset += 4
+            for _ in range(count):
+                offset = read(offset)
+            return offset
+        raise ValueError(f"Unsupported WKB geometry type: {kind}")
+
+    read(0)
+    return polygons, srid
+
+
+def _parse_any(value):
+    if value is None or value == "":
+        raise ValueError("No geometry")
+    if isinstance(value, dict):
+        return _parse_geojson(value)
+    text = str(value).strip()
+    if text.startswith("{"):
+        return _parse_geojson(json.loads(text))
+    if re.fullmatch(r"[0-9A-Fa-f]+", text):
+        return _parse_wkb(bytes.fromhex(text))
+    return _parse_wkt(text)
+
+
+def parse_geometry(value):
+    """(polygons, srid) from a GeoJSON, WKT or hex (E)WKB geometry.
+
+    GeoJSON without a ``crs`` is WGS84 (SRID 4326); WKT and WKB without an
+    SRID are taken as metres. Raises ValueError for a geometry without a
+    ring of at least three points.
+    """
+    polygons, srid = _parse_any(value)
+    polygons = [[ring for ring in polygon if ring] for polygon in polygons]
+    polygons = [polygon for polygon in polygons if polygon and len(polygon[0]) >= 3]
+    if not polygons:
+        raise ValueError("Empty geometry")
+    return polygons, srid
+
+
+# Geometry
+
+def _to_metres(polygons):
+    """Local equirectangular projection of lon/lat polygons to metres."""
+    lats = [y for polygon in polygons for ring in polygon for _, y in ring]
+    scale_x = 111320.0 * math.cos(math.radians(sum(lats) / len(lats)))
+    return [[[(x * scale_x, y * 110540.0) for x, y in ring] for ring in polygon] for polygon in polygons]
+
+
+def _ring_area_centroid(ring):
+    """Signed area and centroid of a ring (shoelace formula)."""
+    area2 = cx = cy = 0.0
+    for (x0, y0), (x1, y1) in zip(ring, ring[1:] + ring[:1]):
+        cross = x0 * y1 - x1 * y0
+        area2 += cross
+        cx += (x0 + x1) * cross
+        cy += (y0 + y1) * cross
+    if not area2:
+        xs, ys = zip(*ring)
+        return 0.0, (sum(xs) / len(xs), sum(ys) / len(ys))
+    return area2 / 2, (cx / (3 * area2), cy / (3 * area2))
+
+
+def area_and_centroid(polygons):
+    """Total area (holes subtracted) and area-weighted centroid."""
+    total = cx = cy = 0.0
+    for polygon in polygons:
+        for i, ring in enumerate(polygon):
+            if len(ring) < 3:
+                continue
+            area, (x, y) = _ring_area_centroid(ring)
+            # The outer ring adds area, holes take it away, whatever the winding
+            area = abs(area) if i == 0 else -abs(area)
+            total += area
+            cx += x * area
+            cy += y * area
+    if not total:
+        return 0.0, None
+    return total, (cx / total, cy / total)
+
+
+def _segments(polygons):
+    for polygon in polygons:
+        for ring in polygon:
+            for a, b in zip(ring, ring[1:] + ring[:1]):
+                if a != b:
+                    yield a, b
+
+
+def _point_segment_distance(p, a, b):
+    (px, py), (ax, ay), (bx, by) = p, a, b
+    dx, dy = bx - ax, by - ay
+    t = max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
+
+
+def _bbox(polygons):
+    xs = [x for polygon in polygons for ring in polygon for x, _ in ring]
+    ys = [y for polygon in polygons for ring in polygon for _, y in ring]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def boundaries_within(polygons_a, polygons_b, tolerance):
+    """True if the boundaries of two zones come within ``tolerance``.
+
+    Vertex-to-edge distances both ways; enough for zones that share or
+    nearly share walls, which is what adjacency means here.
+    """
+    ax0, ay0, ax1, ay1 = _bbox(polygons_a)
+    bx0, by0, bx1, by1 = _bbox(polygons_b)
+    if ax0 - tolerance > bx1 or bx0 - tolerance > ax1 or ay0 - tolerance > by1 or by0 - tolerance > ay1:
+        return False
+    segments_a = list(_segments(polygons_a))
+    segments_b = list(_segments(polygons_b))
+    for points, segments in ((segments_a, segments_b), (segments_b, segments_a)):
+        for point, _ in points:
+            for a, b in segments:
+                if _point_segment_distance(point, a, b) <= tolerance:
+                    return True
+    return False
+
+
+class ZoneIndex:
+    """Parsed zone polygons and their prompt summaries."""
+
+    def __init__(self, zone_rows, tolerance=ADJACENCY_TOLERANCE):
+        self.rows = list(zone_rows or [])
+        self._polygons = {}
+        self.summaries = []
+        # zone_id -> polygons in metres, for area and adjacency
+        metric = {}
+        for row in self.rows:
+            polygons = metres = None
+            geographic = False
+            area = centroid = None
+            try:
+                polygons, srid = parse_geometry(row.get("geometry"))
+                geographic = srid in GEOGRAPHIC_SRIDS
+                metres = _to_metres(polygons) if geographic else polygons
+                area = area_and_centroid(metres)[0]
+                centroid = area_and_centroid(polygons)[1]
+            except (ValueError, TypeError, KeyError, IndexError, ZeroDivisionError, struct.error) as e:
+                print(f"Could not parse geometry of zone {row.get('zone_id')}: {str(e)}")
+                polygons = metres = None
+            self._polygons[row.get("zone_id")] = polygons
+            # Zones without a usable geometry are left out of the adjacency check
+            metric[row.get("zone_id")] = metres
+            precision = 6 if geographic else 1
+            self.summaries.append({
+                "zone_id": row.get("zone_id"),
+                "zone_no": row.get("zone_no"),
+                "zone_name": row.get("zone_name"),
+                "count_type": row.get("count_type"),
+                "capacity": row.get("capacity"),
+                "area_m2": round(area, 1) if area is not None else None,
+                "centroid": ",".join(f"{round(v, precision) + 0.0:.{precision}f}" for v in centroid) if centroid else None,
+                "adjacent": [],
+            })
+
+        parsed = [(summary, metric[summary["zone_id"]]) for summary in self.summaries]
+        parsed = [(summary, polygons) for summary, polygons in parsed if polygons]
+        for i, (summary_a, polygons_a) in enumerate(parsed):
+            for summary_b, polygons_b in parsed[i + 1:]:
+                if boundaries_within(polygons_a, polygons_b, tolerance):
+                    summary_a["adjacent"].append(summary_b["zone_no"])
+                    summary_b["adjacent"].append(summary_a["zone_no"])
+
+    def polygons(self, zone_id):
+        """Parsed polygons of a zone in its own coordinates, or None if unparseable."""
+        return self._polygons.get(zone_id)
+
+    def summary_rows(self):
+        return [dict(summary, adjacent=" ".join(str(no) for no in summary["adjacent"]) or None)
+                for summary in self.summaries]
+
+
+_indexes = {}
+_last = None
+_lock = threading.Lock()
+
+
+def get_zone_index(zone_rows):
+    """The ``ZoneIndex`` for these rows, built once per distinct content."""
+    global _last
+    last = _last
+    # Rows served from common.rpc_cache are the same object on warm invocations
+    if last is not None and last[0] is zone_rows:
+        return last[1]
+    key = content_hash(zone_rows or [])
+    with _lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = ZoneIndex(zone_rows)
+            # Zones change rarely; keep only the newest few versions
+            while len(_indexes) > 4:
+                _indexes.pop(next(iter(_indexes)))
+        _last = (zone_rows, index)
+    return index
+
+
+def format_zone_summary(zone_rows):
+    """Prompt table of zone summaries (no raw geometry)."""
+    if not zone_rows:
+        return ""
+    return encode_table(get_zone_index(zone_rows).summary_rows(), ZONE_SUMMARY_COLUMNS)
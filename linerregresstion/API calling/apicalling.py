@@ -1,10 +1,13 @@
 import boto3
 import json
 import os
-import requests
-from supabase import create_client, Client
+from supabase import Client
+from common.count_series import format_counts
+from common.http_pool import create_supabase_client
+from common import data_access
 from datetime import datetime, timedelta
-from PyPDF2 import PdfReader
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
+from common.tabular import encode_table
 import concurrent.futures
 
 # CORS Headers
@@ -21,42 +24,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_KEY:
     raise ValueError("SUPABASE_KEY environment variable is not set.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-url2="https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/solvecrowd.pdf?t=2024-12-05T14%3A12%3A59.141Z"
-temp_solvecrowd_path = "/tmp/solvecrowd.pdf"
-
-url = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf?t=2024-11-28T11%3A38%3A17.614Z"
-temp_schedule_path = "/tmp/minohcschedule.pdf"
-
-# Download PDF
-def download_pdf(url, path):
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(path, 'wb') as f:
-            f.write(response.content)
-        print(f"File downloaded successfully to {path}")
-    else:
-        print("Failed to download file.")
-
-# Extract text from the PDF
-def extract_text_from_pdf(pdf_path):
-    with open(pdf_path, 'rb') as file:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-download_pdf(url, temp_schedule_path)
-download_pdf(url2, temp_solvecrowd_path)
-
-pdf_text = extract_text_from_pdf(temp_schedule_path)
-pdf_text2 = extract_text_from_pdf(temp_solvecrowd_path)
-
 # Fetch data concurrently 
 def fetch_all_data():
     with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -101,14 +73,8 @@ def fetch_thirdFloor_zone():
     return fetch_data_from_supabase('get_thirdfloor_zones')
 
 def fetch_data_from_supabase(function_name, params=None):
-    try:
-        data = supabase.rpc(function_name, params).execute()
-        if data.data:
-            return data.data
-        return None
-    except Exception as e:
-        print(f"Error fetching data: {str(e)}")
-        return None
+    # Identical RPCs already in flight from the other threads are joined
+    return data_access.fetch_data_from_supabase(supabase, function_name, params)
 
 # Function to choose which data to fetch based on the question
 def select_relevant_data(question, all_data):
@@ -123,7 +89,7 @@ def select_relevant_data(question, all_data):
     elif "zone" in question.lower():
         return all_data['zone_data']
     elif "pdf" in question.lower():
-        return pdf_text2  # for questions related to the "Solvecrowd" PDF
+        return KNOWLEDGE_REGISTRY.text('solvecrowd')  # for questions related to the "Solvecrowd" PDF
     else:
         return all_data['interval_data']
 
@@ -131,16 +97,16 @@ def select_relevant_data(question, all_data):
 def get_answer_from_claude(question, data):
     try:
         context = {
-            'current_data': "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']}" for entry in data['current_data']]),
-            'last_week_data': "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']}" for entry in data['last_week_data']]),
+            'current_data': format_counts(data['current_data']),
+            'last_week_data': format_counts(data['last_week_data']),
             'suspicious_data': "\n".join([f"• Time: {entry['event_time']} - Number of People: {entry['num']}" for entry in data['suspicious_data']]),
             'project_times': "\n".join([f"• Start Time: {entry['start_time']} - End Time: {entry['last_time']}" for entry in data['project_times']]),
             'max_min_data': "\n".join([f"• Max: {entry.get('max_num', 'N/A')} at {entry.get('max_time', 'N/A')}, Min: {entry.get('min_num', 'N/A')} at {entry.get('min_time', 'N/A')}" for entry in data['max_min']]),
-            'interval_data': "\n".join([f"• Time: {entry['time']} - People: {entry['num']}" for entry in data['interval_data']]),
-            'weather_data': "\n".join([f"• Time: {entry['weather_time']} - Temperature: {entry['temperature_2m_celsius']}" for entry in data['weather_times']]),
+            'interval_data': format_counts(data['interval_data'], label='People'),
+            'weather_data': encode_table(data['weather_times'], ['weather_time', 'temperature_2m_celsius']),
             'zone_data': "\n".join([f"• Zone: {entry['zone_name']} - Capacity: {entry['capacity']}" for entry in data['zone_data']]),
-            'pdf_text': pdf_text,
-            'pdf_text2': pdf_text2,
+            'pdf_text': KNOWLEDGE_REGISTRY.text('schedule'),
+            'pdf_text2': KNOWLEDGE_REGISTRY.text('solvecrowd'),
         }
 
         relevant_data = select_relevant_data(question, data)
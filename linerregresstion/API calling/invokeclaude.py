@@ -1,10 +1,11 @@
 import boto3
 import json
 import os
-import requests
-from supabase import create_client, Client
+from supabase import Client
+from common.http_pool import create_supabase_client
+from common import data_access
 from datetime import datetime, timedelta
-from PyPDF2 import PdfReader
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
 import concurrent.futures
 
 # CORS Headers
@@ -21,42 +22,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_KEY:
     raise ValueError("SUPABASE_KEY environment variable is not set.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-url2 = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/solvecrowd.pdf?t=2024-12-05T14%3A12%3A59.141Z"
-temp_solvecrowd_path = "/tmp/solvecrowd.pdf"
-
-url = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf?t=2024-11-28T11%3A38%3A17.614Z"
-temp_schedule_path = "/tmp/minohcschedule.pdf"
-
-# Download PDF
-def download_pdf(url, path):
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(path, 'wb') as f:
-            f.write(response.content)
-        print(f"File downloaded successfully to {path}")
-    else:
-        print("Failed to download file.")
-
-# Extract text from the PDF
-def extract_text_from_pdf(pdf_path):
-    with open(pdf_path, 'rb') as file:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-download_pdf(url, temp_schedule_path)
-download_pdf(url2, temp_solvecrowd_path)
-
-pdf_text = extract_text_from_pdf(temp_schedule_path)
-pdf_text2 = extract_text_from_pdf(temp_solvecrowd_path)
-
 # Fetch data concurrently 
 def fetch_all_data():
     with concurrent.futures.ThreadPoolExecutor() as executor:
@@ -101,14 +71,8 @@ def fetch_thirdFloor_zone():
     return fetch_data_from_supabase('get_thirdfloor_zones')
 
 def fetch_data_from_supabase(function_name, params=None):
-    try:
-        data = supabase.rpc(function_name, params).execute()
-        if data.data:
-            return data.data
-        return None
-    except Exception as e:
-        print(f"Error fetching data: {str(e)}")
-        return None
+    # Identical RPCs already in flight from the other threads are joined
+    return data_access.fetch_data_from_supabase(supabase, function_name, params)
 
 # Generate the prompt for Bedrock with function calling capabilities
 def get_answer_from_claude(question, data):
@@ -123,8 +87,8 @@ def get_answer_from_claude(question, data):
             'interval_data': data['interval_data'],
             'weather_data': data['weather_times'],
             'zone_data': data['zone_data'],
-            'pdf_text': pdf_text,
-            'pdf_text2': pdf_text2,
+            'pdf_text': KNOWLEDGE_REGISTRY.text('schedule'),
+            'pdf_text2': KNOWLEDGE_REGISTRY.text('solvecrowd'),
         }
 
         prompt = f"""
@@ -2,6 +2,7 @@ import boto3
 import json
 import os
 from supabase import create_client, Client
+from common.data_access import fetch_bundle_sync
 
 # CORS Headers
 CORS_HEADERS = {
@@ -33,40 +34,6 @@ def fetch_current_data():
         print(f"Error fetching current data: {str(e)}")
         return None
 
-# Data Fetching Functions
-def fetch_suspicious_data():
-    try:
-        data = supabase.rpc('get_find_suspicious').execute()
-        if data.data:
-            return data.data
-        print("No suspicious data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching suspicious data: {str(e)}")
-        return None
-
-def fetch_start_last_times():
-    try:
-        data = supabase.rpc('get_start_time_and_last_time').execute()
-        if data.data:
-            return data.data
-        print("No project time data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching project times: {str(e)}")
-        return None
-
-def fetch_get_max_min_data():
-    try:
-        data = supabase.rpc('get_max_min_data').execute()
-        if data.data:
-            return data.data
-        print("No max-min data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching max-min data: {str(e)}")
-        return None
-
 def fetch_all_predictiondata():
     try:
         data = supabase.rpc('get_all_predictiondata').execute()
@@ -150,32 +117,18 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No question provided.'})
         }
 
-    # Step 1: Fetch suspicious data
-    suspicious_data = fetch_suspicious_data()
-    if not suspicious_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No suspicious data found.'})
-        }
-
-    # Step 2: Fetch project times
-    project_times = fetch_start_last_times()
-    if not project_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No project times data found.'})
-        }
-
-    # Step 3: Fetch max-min data
-    max_min = fetch_get_max_min_data()
-    if not max_min:
+    # Step 1: Fetch the datasets concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['suspicious_data', 'project_times', 'max_min'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No max-min data found.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    suspicious_data = data.suspicious_data
+    project_times = data.project_times
+    max_min = data.max_min
     
     # Step 4: Fetch prediction data
     prediction_data = fetch_all_predictiondata()
@@ -3,6 +3,7 @@ import json
 import os
 from supabase import create_client, Client
 from datetime import datetime, timedelta
+from common.data_access import fetch_bundle_sync
 
 # CORS Headers
 CORS_HEADERS = {
@@ -23,39 +24,6 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-def fetch_suspicious_data():
-    try:
-        data = supabase.rpc('get_find_suspicious').execute()
-        if data.data:
-            return data.data  
-        print("No suspicious data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching suspicious data: {str(e)}")
-        return None
-
-def fetch_start_last_times():
-    try:
-        data = supabase.rpc('get_start_time_and_last_time').execute()
-        if data.data:
-            return data.data
-        print("No project time data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching project times: {str(e)}")
-        return None
-
-def fetch_get_max_min_data():
-    try:
-        data = supabase.rpc('get_max_min_data').execute()
-        if data.data:
-            return data.data
-        print("No max-min data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching max-min data: {str(e)}")
-        return None
-
 def get_answer_from_claude(question, suspicious_data, start_last_times, max_min_data):
     try:
         # Format suspicious data
@@ -149,32 +117,18 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No question provided.'})
         }
 
-    # Step 1: Fetch suspicious data
-    suspicious_data = fetch_suspicious_data()
-    if not suspicious_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No suspicious data found.'})
-        }
-
-    # Step 2: Fetch project times
-    project_times = fetch_start_last_times()
-    if not project_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No project times data found.'})
-        }
-
-    # Step 3: Fetch max-min data
-    max_min = fetch_get_max_min_data()
-    if not max_min:
+    # Step 1: Fetch the datasets concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['suspicious_data', 'project_times', 'max_min'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No max-min data found.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    suspicious_data = data.suspicious_data
+    project_times = data.project_times
+    max_min = data.max_min
 
     # Step 4: Get answer from Claude
     answer = get_answer_from_claude(user_question, suspicious_data, project_times, max_min)
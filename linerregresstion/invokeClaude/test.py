@@ -4,6 +4,8 @@ import os
 import re
 from supabase import create_client, Client
 from datetime import datetime, timedelta
+from common.tabular import format_data_for_claude
+from common.data_access import fetch_bundle_sync
 
 # CORS Headers
 CORS_HEADERS = {
@@ -62,51 +64,6 @@ def invoke_prediction_lambda(user_question):
         return {"error": "Failed to invoke the Lambda function."}
 
  
-# Data Fetching Functions
-def fetch_current_data():
-    try:
-        data = supabase.rpc('get_current_time_data').execute()
-        if data.data:
-            return data.data
-        print("No current data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching current data: {str(e)}")
-        return None
-    
-def fetch_suspicious_data():
-    try:
-        data = supabase.rpc('get_find_suspicious').execute()
-        if data.data:
-            return data.data  
-        print("No suspicious data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching suspicious data: {str(e)}")
-        return None
-
-def fetch_start_last_times():
-    try:
-        data = supabase.rpc('get_start_time_and_last_time').execute()
-        if data.data:
-            return data.data
-        print("No project time data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching project times: {str(e)}")
-        return None
-
-def fetch_get_max_min_data():
-    try:
-        data = supabase.rpc('get_max_min_data').execute()
-        if data.data:
-            return data.data
-        print("No max-min data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching max-min data: {str(e)}")
-        return None
-    
 def extract_relevant_data(user_question):
     if re.search(r'(現在時間|今)', user_question):
         return "current_data"
@@ -179,21 +136,6 @@ Please provide a clear, concise answer based on the available data:"""
         print(f"Error querying Bedrock: {str(e)}")
         return "Sorry, there was an error processing your question."
 
-# Format Data for Claude Model
-def format_data_for_claude(data, data_type):
-
-    if data_type == "suspicious":
-        return "\n不審者:\n" + "\n".join([f"• Time: {entry['event_time']} - Number of People: {entry['num']}" for entry in data])
-    elif data_type == "project_times":
-        return "\n入り帰りデータ:\n" + "\n".join([f"•入り時間: {entry['start_time']}, 帰り時間: {entry['last_time']}" for entry in data])
-    elif data_type == "max_min":
-        return "\n最大最小データ:\n" + "\n".join([f"• 一番多い人: {entry.get('max_num', 'N/A')} at {entry.get('max_time', 'N/A')}\n"                                                f"• 一番少ない人: {entry.get('min_num', 'N/A')} at {entry.get('min_time', 'N/A')}" for entry in data])
-    elif data_type == "current_data":
-        return "\n現在データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']}" for entry in data])
-    elif data_type == "prediction":
-        return "\n予想データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']} - Reason: {entry['reasons']}" for entry in data])
-    
-
 # Lambda Handler Function
 def lambda_handler(event, context):
     http_method = event.get('httpMethod', None)
@@ -224,40 +166,19 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No question provided.'})
         }
 
-    # Step 1: Fetch suspicious data
-    suspicious_data = fetch_suspicious_data()
-    if not suspicious_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No suspicious data found.'})
-        }
-
-    # Step 2: Fetch project times
-    project_times = fetch_start_last_times()
-    if not project_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No project times data found.'})
-        }
-
-    # Step 3: Fetch max-min data
-    max_min = fetch_get_max_min_data()
-    if not max_min:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No max-min data found.'})
-        }
-    
-    current_data = fetch_current_data()
-    if not current_data:
+    # Step 1: Fetch the datasets concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['suspicious_data', 'project_times', 'max_min', 'current_data'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No current data found.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    suspicious_data = data.suspicious_data
+    project_times = data.project_times
+    max_min = data.max_min
+    current_data = data.current_data
     
     # Step 4: Invoke the prediction Lambda
     prediction_data = invoke_prediction_lambda(user_question)
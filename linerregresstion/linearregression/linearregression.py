@@ -1,25 +1,36 @@
+import os
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from sklearn.linear_model import LinearRegression
 from sklearn.model_selection import train_test_split
 import json
+from supabase import Client
+from common.count_series import CountSeries
+from common.data_access import fetch_data_from_supabase
+from common.http_pool import create_supabase_client
+
+SUPABASE_URL = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co"
+SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+
+if not SUPABASE_KEY:
+    raise ValueError("SUPABASE_KEY environment variable is not set.")
+
+supabase: Client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Step 1: Fetch last week's data
 def get_last_week_data():
-    data = pd.DataFrame({
-        'timestamp': timestamps,
-        'people_count': people_count
+    rows = fetch_data_from_supabase(supabase, 'get_last_week_data')
+    return CountSeries.from_rows(rows)
+
+# Step 2: Prepare data for the model (JST features straight from the arrays)
+def prepare_data_for_model(series):
+    X = pd.DataFrame({
+        'hour': series.jst_hours(),
+        'minute': series.jst_minutes(),
+        'day_of_week': series.jst_weekdays(),  # 0=Monday, 6=Sunday
     })
-    return data
-
-# Step 2: Prepare data for the model
-def prepare_data_for_model(data):
-    data['hour'] = data['timestamp'].dt.hour
-    data['minute'] = data['timestamp'].dt.minute
-    data['day_of_week'] = data['timestamp'].dt.dayofweek  # 0=Monday, 6=Sunday
-    X = data[['hour', 'minute', 'day_of_week']]
-    y = data['people_count']
+    y = series.counts
     return X, y
 
 # Step 3: Train the model
@@ -67,6 +78,12 @@ def lambda_handler(event, context):
 
     # Fetch last week's data
     data = get_last_week_data()
+    if not data:
+        return {
+            'statusCode': 404,
+            'headers': CORS_HEADERS,
+            'body': json.dumps({'message': 'No last week data found.'})
+        }
 
     # Prepare data for the model
     X, y = prepare_data_for_model(data)
@@ -79,7 +96,7 @@ def lambda_handler(event, context):
 
     # Prepare the predictions response
     predictions_json = [{"timestamp": ts, "predicted_people": int(pred)} 
-                        for ts, pred in zip(data['timestamp'], predictions)]
+                        for ts, pred in zip(data.time_strings().tolist(), predictions)]
 
     # Return predictions as JSON
     return {
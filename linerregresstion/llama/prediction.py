@@ -1,10 +1,12 @@
 import boto3
 import json
 import os
-import requests
 from supabase import create_client, Client
 from datetime import datetime, timedelta
-from PyPDF2 import PdfReader
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
+from common.tabular import WEATHER_COLUMNS, encode_table
+from common.zone_summary import format_zone_summary
+from common.data_access import fetch_bundle_sync
 
 # CORS Headers
 CORS_HEADERS = {
@@ -25,79 +27,6 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-# URL for the PDF file
-url = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf?t=2024-11-28T11%3A38%3A17.614Z"
-temp_file_path = "/tmp/minohcschedule.pdf"
-
-# Download PDF
-response = requests.get(url)
-if response.status_code == 200:
-    with open(temp_file_path, 'wb') as f:
-        f.write(response.content)
-    print(f"File downloaded successfully to {temp_file_path}")
-else:
-    print("Failed to download file.")
-
-# Extract text from the PDF
-def extract_text_from_pdf(pdf_path):
-    with open(pdf_path, 'rb') as file:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-# Extract text from the downloaded PDF
-pdf_text = extract_text_from_pdf(temp_file_path)
-
-# Function to fetch third floor zone data from Supabase
-def fetch_last_week_data():
-    try:
-        data = supabase.rpc('get_last_week_data').execute()
-        if data.data:
-            return data.data
-        print("No last_week_data.")
-        return None
-    except Exception as e:
-        print(f"Error fetching thirdFloor_zone: {str(e)}")
-        return None
-
-# Function to fetch third floor zone data from Supabase
-def fetch_thirdFloor_zone():
-    try:
-        data = supabase.rpc('get_thirdfloor_zones').execute()
-        if data.data:
-            return data.data
-        print("No thirdFloor_zone.")
-        return None
-    except Exception as e:
-        print(f"Error fetching thirdFloor_zone: {str(e)}")
-        return None
-
-# Function to fetch data for the interval from Supabase
-def fetch_data_for_interval():
-    try:
-        data = supabase.rpc('get_thirdfloor_hourdata', {'hours_interval': 1}).execute()
-        if data.data:
-            return data.data
-        print("No data data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching data: {str(e)}")
-        return None
-
-# Function to fetch weather data for the next days from Supabase
-def fetch_weather_data_for_next_days():
-    try:
-        data = supabase.rpc('get_weather_data_for_next_days', {'num_days': 1}).execute()
-        if data.data:
-            return data.data
-        print("No weather data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching weather data: {str(e)}")
-        return None
-
 # Function to get an answer from Claude using the provided data
 def get_answer_from_claude(question, interval_data, weather_data, zone_data, pdf_text, last_week_data):
     try:
@@ -105,23 +34,10 @@ def get_answer_from_claude(question, interval_data, weather_data, zone_data, pdf
         context_interval = "\n人流データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']}" for entry in interval_data])
 
         # Format weather data
-        context_weather = "\n気候データ:\n" + "\n".join([f"•気候時間: {entry['weather_time']}, "
-                                                           f"temperature_2m_celsius: {entry['temperature_2m_celsius']}, "
-                                                           f"relative_humidity_2m_percent: {entry['relative_humidity_2m_percent']}, "
-                                                           f"apparent_temperature_celsius: {entry['apparent_temperature_celsius']}, "
-                                                           f"precipitation_mm: {entry['precipitation_mm']}, "
-                                                           f"snowfall_cm: {entry['snowfall_cm']}, "
-                                                           f"weather_code_wmo_code: {entry['weather_code_wmo_code']}, "
-                                                           f"cloud_cover_percent: {entry['cloud_cover_percent']}, "
-                                                           f"wind_speed_10m_kmh: {entry['wind_speed_10m_kmh']}" for entry in weather_data])
+        context_weather = "\n気候データ:\n" + encode_table(weather_data, WEATHER_COLUMNS)
 
-        # Format zone data
-        context_zone = "\n気候データ:\n" + "\n".join([f"•zone_id: {entry['zone_id']}, "
-                                                           f"zone_no: {entry['zone_no']}, "
-                                                           f"zone_name: {entry['zone_name']}, "
-                                                           f"geometry: {entry['geometry']}, "
-                                                           f"count_type: {entry['count_type']}, "
-                                                           f"capacity: {entry['capacity']} " for entry in zone_data])
+        # Zone areas, centroids and neighbours instead of the raw polygons
+        context_zone = "\n気候データ:\n" + format_zone_summary(zone_data)
 
         # Include the extracted PDF text
         context_pdf = "\nPDF Data:\n" + pdf_text
@@ -201,37 +117,22 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No question provided.'})
         }
 
-    interval_data = fetch_data_for_interval()
-    if not interval_data:
+    # Fetched concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['interval_data', 'weather_times', 'zone_data', 'last_week_data'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_data_for_interval.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    interval_data = data.interval_data
+    weather_times = data.weather_times
+    zone_data = data.zone_data
+    last_week_data = data.last_week_data
 
-    weather_times = fetch_weather_data_for_next_days()
-    if not weather_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_weather_data_for_next_days found.'})
-        }
-    
-    zone_data = fetch_thirdFloor_zone()
-    if not zone_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_3F_zone found.'})
-        }
-    
-    last_week_data = fetch_last_week_data()
-    if not last_week_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_3F_zone found.'})
-        }
+    # Current schedule text; new knowledge-base versions are picked up without a redeploy
+    pdf_text = KNOWLEDGE_REGISTRY.text('schedule')
 
     answer = get_answer_from_claude(user_question, interval_data, weather_times, zone_data, pdf_text, last_week_data)
 
@@ -2,10 +2,11 @@ import boto3
 import json
 import os
 import re
-import requests
 from supabase import create_client, Client
 from datetime import datetime, timedelta
-from PyPDF2 import PdfReader
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
+from common.tabular import format_data_for_claude
+from common.data_access import fetch_bundle_sync
 
 # CORS Headers
 CORS_HEADERS = {
@@ -36,67 +37,12 @@ def fetch_current_data():
         print(f"Error fetching current data: {str(e)}")
         return None
 
-# call suspicious data   
-def fetch_suspicious_data():
-    try:
-        data = supabase.rpc('get_find_suspicious').execute()
-        if data.data:
-            return data.data  
-        print("No suspicious data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching suspicious data: {str(e)}")
-        return None
-
-# call start and last times
-def fetch_start_last_times():
-    try:
-        data = supabase.rpc('get_start_time_and_last_time').execute()
-        if data.data:
-            return data.data
-        print("No project time data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching project times: {str(e)}")
-        return None
-
-# call max and min data
-def fetch_get_max_min_data():
-    try:
-        data = supabase.rpc('get_max_min_data').execute()
-        if data.data:
-            return data.data
-        print("No max-min data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching max-min data: {str(e)}")
-        return None
-
 def fetch_all_predictiondata():
-    url = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf?t=2024-11-28T11%3A38%3A17.614Z"
-    temp_file_path = "/tmp/minohcschedule.pdf"
-
-    # Download PDF
-    response = requests.get(url)
-    if response.status_code == 200:
-        with open(temp_file_path, 'wb') as f:
-            f.write(response.content)
-        print(f"File downloaded successfully to {temp_file_path}")
-    else:
-        print("Failed to download file.")
-        return None  # Early return if the file download fails
-
-    # Extract text from the PDF
-    def extract_text_from_pdf(pdf_path):
-        with open(pdf_path, 'rb') as file:
-            reader = PdfReader(file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
-        return text
-
-    # Extract text from the downloaded PDF
-    pdf_text = extract_text_from_pdf(temp_file_path)
+    # Current schedule text from the shared knowledge-base registry
+    pdf_text = KNOWLEDGE_REGISTRY.text('schedule')
+    if not pdf_text:
+        print("Failed to load the schedule document.")
+        return None  # Early return if the document could not be loaded
 
     # Function to fetch third floor zone data from Supabase
     def fetch_thirdFloor_zone():
@@ -223,46 +169,6 @@ Please provide a clear, concise answer based on the available data:"""
         print(f"Error querying Bedrock: {str(e)}")
         return "Sorry, there was an error processing your question."
 
-# Format Data for Claude Model
-def format_data_for_claude(data, data_type):
-
-    if data_type == "suspicious":
-        return "\n不審者:\n" + "\n".join([f"• Time: {entry['event_time']} - Number of People: {entry['num']}" for entry in data])
-    elif data_type == "project_times":
-        return "\n入り帰りデータ:\n" + "\n".join([f"•入り時間: {entry['start_time']}, 帰り時間: {entry['last_time']}" for entry in data])
-    elif data_type == "max_min":
-        return "\n最大最小データ:\n" + "\n".join([f"• 一番多い人: {entry.get('max_num', 'N/A')} at {entry.get('max_time', 'N/A')}\n"                                                f"• 一番少ない人: {entry.get('min_num', 'N/A')} at {entry.get('min_time', 'N/A')}" for entry in data])
-    elif data_type == "current_data":
-        return "\n現在データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']}" for entry in data])
-    elif data_type == "prediction":
-        # Format interval data
-        context_interval = "\n人流データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['num']}" for entry in data])
-
-        # Format weather data
-        context_weather = "\n気候データ:\n" + "\n".join([f"•気候時間: {entry['weather_time']}, "
-                                                           f"temperature_2m_celsius: {entry['temperature_2m_celsius']}, "
-                                                           f"relative_humidity_2m_percent: {entry['relative_humidity_2m_percent']}, "
-                                                           f"apparent_temperature_celsius: {entry['apparent_temperature_celsius']}, "
-                                                           f"precipitation_mm: {entry['precipitation_mm']}, "
-                                                           f"snowfall_cm: {entry['snowfall_cm']}, "
-                                                           f"weather_code_wmo_code: {entry['weather_code_wmo_code']}, "
-                                                           f"cloud_cover_percent: {entry['cloud_cover_percent']}, "
-                                                           f"wind_speed_10m_kmh: {entry['wind_speed_10m_kmh']}" for entry in data]) 
-
-        # Format zone data
-        context_zone = "\nゾーンデータ:\n" + "\n".join([f"•zone_id: {entry['zone_id']}, "
-                                                           f"zone_no: {entry['zone_no']}, "
-                                                           f"zone_name: {entry['zone_name']}, "
-                                                           f"geometry: {entry['geometry']}, "
-                                                           f"count_type: {entry['count_type']}, "
-                                                           f"capacity: {entry['capacity']}" for entry in data]) 
-
-        # Include the extracted PDF text
-        context_pdf = "\nPDF Data:\n" + data 
-
-        # Combine all contexts into one string and return
-        return context_interval + "\n" + context_weather + "\n" + context_zone + "\n" + context_pdf
-
 # Lambda Handler Function
 def lambda_handler(event, context):
     http_method = event.get('httpMethod', None)
@@ -293,32 +199,18 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No question provided.'})
         }
 
-    # Step 1: Fetch suspicious data
-    suspicious_data = fetch_suspicious_data()
-    if not suspicious_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No suspicious data found.'})
-        }
-
-    # Step 2: Fetch project times
-    project_times = fetch_start_last_times()
-    if not project_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No project times data found.'})
-        }
-
-    # Step 3: Fetch max-min data
-    max_min = fetch_get_max_min_data()
-    if not max_min:
+    # Step 1: Fetch the datasets concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['suspicious_data', 'project_times', 'max_min'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No max-min data found.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    suspicious_data = data.suspicious_data
+    project_times = data.project_times
+    max_min = data.max_min
     
     prediction_data = fetch_all_predictiondata()
     if not prediction_data:
@@ -1,11 +1,12 @@
 import os
 import json
 import boto3
-import requests
 from supabase import create_client
-from PyPDF2 import PdfReader
 import concurrent.futures
-import functools
+from common.context_budget import (ContextSection, assemble, count_levels, document_levels, estimate_tokens, list_levels,
+                                   with_header, zone_levels)
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
+from common.zone_summary import format_zone_summary
 
 # Global clients to reduce initialization overhead
 BEDROCK_CLIENT = boto3.client('bedrock-runtime', region_name='us-east-1')
@@ -14,6 +15,11 @@ SUPABASE_CLIENT = create_client(
     os.getenv("SUPABASE_KEY", "")
 )
 
+# Small input budget keeps this handler's Bedrock calls fast
+FAST_TOKEN_BUDGET = int(os.getenv("FAST_PROMPT_TOKEN_BUDGET", "3000"))
+COUNT_KEYS = ('current_data', 'last_week_data')
+PDF_DOCUMENTS = ('schedule', 'solvecrowd')
+
 # Cached CORS headers
 CORS_HEADERS = {
     'Access-Control-Allow-Origin': '*',
@@ -21,46 +27,6 @@ CORS_HEADERS = {
     'Access-Control-Allow-Methods': 'OPTIONS,POST,GET'
 }
 
-def memoize(func):
-    """Simple memoization decorator to cache expensive function calls."""
-    cache = {}
-    @functools.wraps(func)
-    def wrapper(*args, **kwargs):
-        key = str(args) + str(kwargs)
-        if key not in cache:
-            cache[key] = func(*args, **kwargs)
-        return cache[key]
-    return wrapper
-
-@memoize
-def download_and_extract_pdf(url):
-    """
-    Download and extract PDF text with memoization.
-    
-    Args:
-        url (str): PDF URL to download
-    
-    Returns:
-        str: Extracted PDF text
-    """
-    try:
-        # Download PDF
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        
-        # Save temporarily
-        temp_path = f"/tmp/{hash(url)}.pdf"
-        with open(temp_path, 'wb') as f:
-            f.write(response.content)
-        
-        # Extract text
-        with open(temp_path, 'rb') as file:
-            reader = PdfReader(file)
-            return " ".join(page.extract_text() for page in reader.pages)
-    
-    except Exception:
-        return ""
-
 def fast_parallel_fetch(functions):
     """
     Fetch multiple Supabase functions in parallel with minimal overhead.
@@ -96,16 +62,30 @@ def generate_claude_prompt(question, data, pdf_texts):
     Returns:
         str: Compact prompt
     """
-    context = "\n".join([
-        f"• {key}: {json.dumps(value[:5]) if isinstance(value, list) else value}"
-        for key, value in data.items() if value
-    ])
-    
-    pdf_context = "\n".join(pdf_texts) if pdf_texts else ""
+    sections = []
+    for key, value in data.items():
+        if not value:
+            continue
+        # Count rows summarize to hourly/daily figures, zones to their summaries,
+        # other lists to their newest rows
+        if key in COUNT_KEYS:
+            levels = count_levels(value)
+        elif key == "zone_data":
+            levels = zone_levels(value, format_zone_summary)
+        else:
+            levels = list_levels(value, steps=(None, 5))
+        sections.append(ContextSection(key, with_header(f"• {key}:\n", levels)))
+    for i, text in enumerate(pdf_texts or []):
+        sections.append(ContextSection(f"pdf{i}", document_levels(question, text)))
+
+    context = assemble(sections, FAST_TOKEN_BUDGET, reserved=estimate_tokens(question))
+    texts = context.texts
+    data_context = "\n".join(texts[section.name] for section in sections if not section.name.startswith("pdf") and texts[section.name])
+    pdf_context = "\n".join(texts[section.name] for section in sections if section.name.startswith("pdf") and texts[section.name])
     
     return f"""建物利用状況分析:
-{context}
-PDF情報: {pdf_context[:500]}
+{data_context}
+PDF情報: {pdf_context}
 
 質問: {question}
 簡潔かつ正確に回答してください。"""
@@ -165,15 +145,9 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Invalid request'})
         }
 
-    # PDF URLs (consider making these configurable)
-    pdf_urls = [
-        "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf",
-        "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/solvecrowd.pdf"
-    ]
-
-    # Parallel PDF text extraction
+    # Knowledge documents from the shared registry (current versions, loaded in parallel on first use)
     with concurrent.futures.ThreadPoolExecutor() as executor:
-        pdf_texts = list(executor.map(download_and_extract_pdf, pdf_urls))
+        pdf_texts = list(executor.map(KNOWLEDGE_REGISTRY.text, PDF_DOCUMENTS))
 
     # Parallel Supabase data fetch
     data_functions = {
@@ -8,7 +8,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timedelta
 from mangum import Mangum  # For AWS Lambda
 import pytz
-from supabase import create_client, Client
+from supabase import Client
+from common.http_pool import create_supabase_client, get_async_http_client
 import traceback
 
 app = FastAPI()
@@ -16,7 +17,7 @@ app = FastAPI()
 #connect supabase
 SUPABASE_URL = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co"
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # CORS Middleware configuration
 app.add_middleware(
@@ -36,8 +37,9 @@ async def fetch_weather_data():
     try:
         weather_url = f"https://api.open-meteo.com/v1/forecast?latitude=34.664967&longitude=135.451014&hourly=temperature_2m,relative_humidity_2m,apparent_temperature,precipitation,snowfall,weather_code,cloud_cover,wind_speed_10m&timezone=Asia%2FTokyo&forecast_days=1"
 
-        async with httpx.AsyncClient(timeout=httpx.Timeout(30.0)) as client:  
-            response = await client.get(weather_url)
+        # Pooled client, reused by warm invocations on the same event loop
+        client = get_async_http_client()
+        response = await client.get(weather_url)
 
         print(f"Weather Data API Response: {response.status_code}, {response.text}")
 
@@ -57,8 +59,40 @@ async def fetch_weather_data():
         print(f"Error occurred while fetching data: {str(e)}")
         print("Traceback:", traceback.format_exc())  
 
+# time -> row as last written to weather_data, kept across warm invocations
+last_stored_weather = {}
+
+
+def build_weather_rows(hourly_data):
+    """One weather_data row per forecast hour."""
+    return [
+        {
+            "time": time,  # ISO8601 format from the API
+            "temperature_2m_celsius": hourly_data['temperature_2m'][idx],
+            "relative_humidity_2m_percent": hourly_data['relative_humidity_2m'][idx],
+            "apparent_temperature_celsius": hourly_data['apparent_temperature'][idx],
+            "precipitation_mm": hourly_data['precipitation'][idx],
+            "snowfall_cm": hourly_data['snowfall'][idx],
+            "weather_code_wmo_code": hourly_data['weather_code'][idx],
+            "cloud_cover_percent": hourly_data['cloud_cover'][idx],
+            "wind_speed_10m_kmh": hourly_data['wind_speed_10m'][idx],
+        }
+        for idx, time in enumerate(hourly_data['time'])
+    ]
+
+
+def changed_weather_rows(rows):
+    """Rows that differ from what this container last stored."""
+    return [row for row in rows if last_stored_weather.get(row["time"]) != row]
+
+
 async def store_weather_data():
-    """Store weather data in the Supabase database."""
+    """Store weather data in the Supabase database.
+
+    Only hours whose forecast changed since the last store are sent, in a
+    single upsert keyed on time (weather_data.time must be unique). A cold
+    container has no previous forecast and upserts every hour once.
+    """
     global weather_data_cache  
 
     if not weather_data_cache:
@@ -66,34 +100,21 @@ async def store_weather_data():
         return
 
     try:
-       
-        hourly_data = weather_data_cache['hourly']  
-
-        # get hourly data
-        for idx, time in enumerate(hourly_data['time']):
-            insert_data = {
-                "time": time,  # ISO8601 format from the API
-                "temperature_2m_celsius": hourly_data['temperature_2m'][idx],
-                "relative_humidity_2m_percent": hourly_data['relative_humidity_2m'][idx],
-                "apparent_temperature_celsius": hourly_data['apparent_temperature'][idx],
-                "precipitation_mm": hourly_data['precipitation'][idx],
-                "snowfall_cm": hourly_data['snowfall'][idx],
-                "weather_code_wmo_code": hourly_data['weather_code'][idx],
-                "cloud_cover_percent": hourly_data['cloud_cover'][idx],
-                "wind_speed_10m_kmh": hourly_data['wind_speed_10m'][idx],
-            }
-
-            #check existing record
-            existing_record = supabase.table("weather_data").select("time").eq("time", time).execute()
-
-            # updata data
-            if existing_record.data:
-                update_response = supabase.table("weather_data").update(insert_data).eq("time", time).execute()
-                print(f"Updated data for time {time}: {update_response}")
-            else:
-                # insert data
-                insert_response = supabase.table("weather_data").insert(insert_data).execute()
-                print(f"Inserted new data for time {time}: {insert_response}")
+        rows = build_weather_rows(weather_data_cache['hourly'])
+        changed = changed_weather_rows(rows)
+        if not changed:
+            print(f"Weather forecast unchanged for all {len(rows)} hours, nothing to store.")
+            return
+
+        # insert or update all changed hours in one round trip
+        supabase.table("weather_data").upsert(changed, on_conflict="time").execute()
+        # hours that dropped out of the forecast window are not needed again
+        current = {row["time"]: row for row in rows}
+        for time in list(last_stored_weather):
+            if time not in current:
+                del last_stored_weather[time]
+        last_stored_weather.update((row["time"], row) for row in changed)
+        print(f"Upserted {len(changed)} of {len(rows)} hourly weather rows.")
 
     except Exception as e:
         print(f"Error while processing and inserting weather data: {str(e)}")
@@ -1,10 +1,13 @@
 import boto3
 import json
 import os
-import requests
-from supabase import create_client, Client
+from supabase import Client
+from common.context_budget import ContextSection, assemble, count_levels, document_levels, estimate_tokens, weather_levels, with_header
+from common.data_access import fetch_bundle_sync
+from common.http_pool import create_supabase_client
+from common.tabular import encode_table
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
 from datetime import datetime, timedelta
-from PyPDF2 import PdfReader
 
 # CORS Headers
 CORS_HEADERS = {
@@ -20,60 +23,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_KEY:
     raise ValueError("SUPABASE_KEY environment variable is not set.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-# URL for the PDF file
-url = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf?t=2024-11-28T11%3A38%3A17.614Z"
-temp_file_path = "/tmp/minohcschedule.pdf"
-
-# Download PDF
-response = requests.get(url)
-if response.status_code == 200:
-    with open(temp_file_path, 'wb') as f:
-        f.write(response.content)
-    print(f"File downloaded successfully to {temp_file_path}")
-else:
-    print("Failed to download file.")
-
-# Extract text from the PDF
-def extract_text_from_pdf(pdf_path):
-    with open(pdf_path, 'rb') as file:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-# Extract text from the downloaded PDF
-pdf_text = extract_text_from_pdf(temp_file_path)
-
-
-# Function to fetch third floor zone data from Supabase
-def fetch_last_week_data():
-    try:
-        data = supabase.rpc('get_last_week_data').execute()
-        if data.data:
-            return data.data
-        print("No last_week_data.")
-        return None
-    except Exception as e:
-        print(f"Error fetching thirdFloor_zone: {str(e)}")
-        return None
-
-# Function to fetch third floor zone data from Supabase
-def fetch_thirdFloor_zone():
-    try:
-        data = supabase.rpc('get_thirdfloor_zones').execute()
-        if data.data:
-            return data.data
-        print("No thirdFloor_zone.")
-        return None
-    except Exception as e:
-        print(f"Error fetching thirdFloor_zone: {str(e)}")
-        return None
 
 # Function to fetch data for the interval from Supabase
 def fetch_data_for_interval():
@@ -87,34 +41,25 @@ def fetch_data_for_interval():
         print(f"Error fetching data: {str(e)}")
         return None
 
-# Function to fetch weather data for the next days from Supabase
-def fetch_weather_data_for_next_days():
-    try:
-        data = supabase.rpc('get_weather_data_for_next_days', {'num_days': 1}).execute()
-        if data.data:
-            return data.data
-        print("No weather data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching weather data: {str(e)}")
-        return None
+def format_weather(rows):
+    return encode_table(rows, ["weather_time", "temperature_2m_celsius", "relative_humidity_2m_percent"])
+
 
 # Function to get an answer from Claude using the provided data
 def get_answer_from_claude(question, interval_data, weather_data, zone_data, pdf_text, last_week_data):
     try:
-        # Limit the number of entries sent to the model (e.g., only the most recent 10 entries)
-        context_interval = "\n人流データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['data']}" for entry in interval_data[:10]])
-
-        # For weather data, summarize key attributes or only include the first few entries
-        context_weather = "\n気候データ:\n" + "\n".join([f"•気候時間: {entry['weather_time']}, "
-                                                           f"temperature: {entry['temperature_2m_celsius']}, "
-                                                           f"humidity: {entry['relative_humidity_2m_percent']}%" for entry in weather_data[:5]])
-
-        # Only send a portion of the PDF text (e.g., the first 1000 characters or key information)
-        context_pdf = "\nPDF Data:\n" + pdf_text[:1000]  # First 1000 characters
-
-        # Only send a portion of last_week_data if necessary
-        last_week_data = "\n過去データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['data']}" for entry in last_week_data[:10]])
+        # Sections are summarized, lowest priority first, to fit the token budget
+        context = assemble([
+            ContextSection("interval", with_header("\n人流データ:\n", count_levels(interval_data, value_key='data'))),
+            ContextSection("weather", with_header("\n気候データ:\n", weather_levels(weather_data or [], format_weather))),
+            ContextSection("pdf", with_header("\nPDF Data:\n", document_levels(question, pdf_text))),
+            ContextSection("last_week", with_header("\n過去データ:\n", count_levels(last_week_data, value_key='data'))),
+        ], reserved=estimate_tokens(question))
+        print(f"Prompt context ~{context.tokens}/{context.budget} tokens: {context.summary()}")
+        context_interval = context.texts["interval"]
+        context_weather = context.texts["weather"]
+        context_pdf = context.texts["pdf"]
+        last_week_data = context.texts["last_week"]
 
         prompt = f"""あなたは建物の利用状況を分析するアシスタントです。以下のデータを基に、ユーザーの質問に正確に答えてください。
 
@@ -198,29 +143,21 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No fetch_data_for_interval.'})
         }
 
-    weather_times = fetch_weather_data_for_next_days()
-    if not weather_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_weather_data_for_next_days found.'})
-        }
-    
-    zone_data = fetch_thirdFloor_zone()
-    if not zone_data:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_3F_zone found.'})
-        }
-    
-    last_week_data = fetch_last_week_data()
-    if not last_week_data:
+    # Fetched concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['weather_times', 'zone_data', 'last_week_data'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_3F_zone found.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    weather_times = data.weather_times
+    zone_data = data.zone_data
+    last_week_data = data.last_week_data
+
+    # Current schedule text; new knowledge-base versions are picked up without a redeploy
+    pdf_text = KNOWLEDGE_REGISTRY.text('schedule')
 
     answer = get_answer_from_claude(user_question, interval_data, weather_times, zone_data, pdf_text, last_week_data)
 
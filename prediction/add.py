@@ -1,9 +1,12 @@
 import boto3
 import json
 import os
-import requests
-from PyPDF2 import PdfReader  # Make sure to install this module using `pip install pypdf2`
-from supabase import create_client, Client
+from supabase import Client
+from common.count_series import format_counts
+from common.data_access import fetch_bundle_sync
+from common.http_pool import create_supabase_client
+from common.knowledge_registry import KNOWLEDGE_REGISTRY
+from common.tabular import encode_table
 from datetime import datetime, timedelta
 
 # CORS Headers
@@ -20,59 +23,11 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_KEY:
     raise ValueError("SUPABASE_KEY environment variable is not set.")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: Client = create_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-# Fetch suspicious data
-def fetch_suspicious_data():
-    try:
-        data = supabase.rpc('get_find_suspicious').execute()
-        if data.data:
-            return data.data  
-        print("No suspicious data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching suspicious data: {str(e)}")
-        return None
-
-# Fetch project times
-def fetch_start_last_times():
-    try:
-        data = supabase.rpc('get_start_time_and_last_time').execute()
-        if data.data:
-            return data.data
-        print("No project time data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching project times: {str(e)}")
-        return None
-
-# Fetch max-min data
-def fetch_get_max_min_data():
-    try:
-        data = supabase.rpc('get_max_min_data').execute()
-        if data.data:
-            return data.data
-        print("No max-min data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching max-min data: {str(e)}")
-        return None
-
-# Fetch third floor zone data
-def fetch_thirdFloor_zone():
-    try:
-        data = supabase.rpc('get_thirdfloor_zones').execute()
-        if data.data:
-            return data.data
-        print("No thirdFloor_zone.")
-        return None
-    except Exception as e:
-        print(f"Error fetching thirdFloor_zone: {str(e)}")
-        return None
-
 # Fetch interval data
 def fetch_data_for_interval():
     try:
@@ -85,42 +40,6 @@ def fetch_data_for_interval():
         print(f"Error fetching data: {str(e)}")
         return None
 
-# Fetch weather data for the next days
-def fetch_weather_data_for_next_days():
-    try:
-        data = supabase.rpc('get_weather_data_for_next_days', {'num_days': 1}).execute()
-        if data.data:
-            return data.data
-        print("No weather data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching weather data: {str(e)}")
-        return None
-
-# Download PDF
-url = "https://xsjzbkgsqtvlzyqeqbmx.supabase.co/storage/v1/object/public/ForLidar/Knowledge%20base%20/minohcSchdeule.pdf?t=2024-11-28T11%3A38%3A17.614Z"
-temp_file_path = "/tmp/minohcschedule.pdf"
-
-response = requests.get(url)
-if response.status_code == 200:
-    with open(temp_file_path, 'wb') as f:
-        f.write(response.content)
-    print(f"File downloaded successfully to {temp_file_path}")
-else:
-    print("Failed to download file.")
-
-# Extract text from the PDF
-def extract_text_from_pdf(pdf_path):
-    with open(pdf_path, 'rb') as file:
-        reader = PdfReader(file)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-# Extract text from the downloaded PDF
-pdf_text = extract_text_from_pdf(temp_file_path)
-
 # Function to get answer from Claude (AWS Bedrock)
 def get_answer_from_claude(question, suspicious_data, start_last_times, max_min_data, interval_data, weather_data, zone_data, pdf_text):
     try:
@@ -141,8 +60,8 @@ def get_answer_from_claude(question, suspicious_data, start_last_times, max_min_
         """
 
         # Adding additional context
-        prompt += "\n人流データ:\n" + "\n".join([f"• Time: {entry['time']} - Number of People: {entry['data']}" for entry in interval_data])
-        prompt += "\n気候データ:\n" + "\n".join([f"•気候時間: {entry['weather_time']}, " f"temperature_2m_celsius: {entry['temperature_2m_celsius']}" for entry in weather_data])
+        prompt += "\n人流データ:\n" + format_counts(interval_data, value_key='data')
+        prompt += "\n気候データ:\n" + encode_table(weather_data, ['weather_time', 'temperature_2m_celsius'])
         prompt += "\nゾーンデータ:\n" + "\n".join([f"•zone_id: {entry['zone_id']}, zone_name: {entry['zone_name']}" for entry in zone_data])
         prompt += "\nPDFデータ:\n" + pdf_text
 
@@ -197,13 +116,14 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No question provided.'})
         }
 
-    # Fetch data
-    suspicious_data = fetch_suspicious_data()
-    project_times = fetch_start_last_times()
-    max_min = fetch_get_max_min_data()
+    # Fetch data; the shared datasets concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['suspicious_data', 'project_times', 'max_min', 'weather_times', 'zone_data'])
+    suspicious_data = data.suspicious_data
+    project_times = data.project_times
+    max_min = data.max_min
     interval_data = fetch_data_for_interval()
-    weather_data = fetch_weather_data_for_next_days()
-    zone_data = fetch_thirdFloor_zone()
+    weather_data = data.weather_times
+    zone_data = data.zone_data
 
     # Handle cases where data fetching fails
     if not suspicious_data or not project_times or not max_min or not interval_data or not weather_data or not zone_data:
@@ -213,6 +133,9 @@ def lambda_handler(event, context):
             'body': json.dumps({'error': 'Failed to fetch necessary data.'})
         }
 
+    # Current schedule text; new knowledge-base versions are picked up without a redeploy
+    pdf_text = KNOWLEDGE_REGISTRY.text('schedule')
+
     # Get the answer from Claude
     answer = get_answer_from_claude(user_question, suspicious_data, project_times, max_min, interval_data, weather_data, zone_data, pdf_text)
     
@@ -3,6 +3,9 @@ import json
 import os
 from supabase import create_client, Client
 from datetime import datetime, timedelta
+from common.zone_summary import format_zone_summary
+from common.tabular import WEATHER_COLUMNS, encode_table
+from common.data_access import fetch_bundle_sync
 
 # CORS Headers
 CORS_HEADERS = {
@@ -23,18 +26,6 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # Initialize the AWS Bedrock client for Claude 3
 bedrock_client = boto3.client('bedrock-runtime', region_name='us-east-1')
 
-def fetch_thirdFloor_zone():
-    try:
-        # Use the correct function name, ensuring the case is correct
-        data = supabase.rpc('get_thirdfloor_zones').execute()  # Ensure correct case (lowercase 'f')
-        if data.data:
-            return data.data
-        print("No thirdFloor_zone.")
-        return None
-    except Exception as e:
-        print(f"Error fetching thirdFloor_zone: {str(e)}")
-        return None
-
 # def fetch_data_for_interval():
 #     try:
 #         # Initialize variables for pagination
@@ -81,19 +72,6 @@ def fetch_data_for_interval():
         print(f"Error fetching data: {str(e)}")
         return None
 
-def fetch_weather_data_for_next_days():
-    try:
-        # Call the RPC function with the correct parameter
-        data = supabase.rpc('get_weather_data_for_next_days', {'num_days': 1}).execute()
-        if data.data:
-            return data.data
-        print("No weather data found.")
-        return None
-    except Exception as e:
-        print(f"Error fetching weather data: {str(e)}")
-        return None
-
-
 def get_answer_from_claude(question, interval_data, weather_data, zone_data):
     try:
         # Format suspicious data
@@ -101,24 +79,12 @@ def get_answer_from_claude(question, interval_data, weather_data, zone_data):
         # print(context_interval)
 
         # Format weather data
-        context_weather = "\n気候データ:\n" + "\n".join([f"•気候時間: {entry['weather_time']}, "
-                                                           f"temperature_2m_celsius: {entry['temperature_2m_celsius']}, "
-                                                           f"relative_humidity_2m_percent: {entry['relative_humidity_2m_percent']}, "
-                                                           f"apparent_temperature_celsius: {entry['apparent_temperature_celsius']}, "
-                                                           f"precipitation_mm: {entry['precipitation_mm']}, "
-                                                           f"snowfall_cm: {entry['snowfall_cm']}, "
-                                                           f"weather_code_wmo_code: {entry['weather_code_wmo_code']}, "
-                                                           f"cloud_cover_percent: {entry['cloud_cover_percent']}, "
-                                                           f"wind_speed_10m_kmh: {entry['wind_speed_10m_kmh']}" for entry in weather_data])
+        context_weather = "\n気候データ:\n" + encode_table(weather_data, WEATHER_COLUMNS)
         # print(context_weather)
 
          # Format zone data
-        context_zone = "\n気候データ:\n" + "\n".join([f"•zone_id: {entry['zone_id']}, "
-                                                           f"zone_no: {entry['zone_no']}, "
-                                                           f"zone_name: {entry['zone_name']}, "
-                                                           f"geometry: {entry['geometry']}, "
-                                                           f"count_type: {entry['count_type']}, "
-                                                           f"capacity: {entry['capacity']} " for entry in zone_data])
+        # Zone areas, centroids and neighbours instead of the raw polygons
+        context_zone = "\n気候データ:\n" + format_zone_summary(zone_data)
         # print(context_weather)
 
 
@@ -197,23 +163,17 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'No fetch_data_for_interval.'})
         }
 
-    # Step 2: Fetch project times
-    weather_times = fetch_weather_data_for_next_days()
-    if not weather_times:
-        return {
-            'statusCode': 404,
-            'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_weather_data_for_next_days found.'})
-        }
-    
-    # Step 3: Fetch project times
-    zone_data = fetch_thirdFloor_zone()
-    if not zone_data:
+    # Step 2: Fetch the datasets concurrently with per-RPC timeouts
+    data = fetch_bundle_sync(supabase, ['weather_times', 'zone_data'])
+    missing = data.missing()
+    if missing:
         return {
             'statusCode': 404,
             'headers': CORS_HEADERS,
-            'body': json.dumps({'message': 'No fetch_3F_zone found.'})
+            'body': json.dumps({'message': f'No {missing[0]} found.'})
         }
+    weather_times = data.weather_times
+    zone_data = data.zone_data
 
 
     # Step 4: Get answer from Claude
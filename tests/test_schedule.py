@@ -0,0 +1,16 @@
+from datetime import date
+
+from common.schedule import parse_schedule
+
+
+def test_period_range_is_not_read_as_a_date():
+    rows = parse_schedule("4月10日 1-2限 授業\n4月11日 3限 授業\n4月12日 1-2時限 授業", 2024)
+
+    assert [row.date for row in rows] == [date(2024, 4, 10), date(2024, 4, 11), date(2024, 4, 12)]
+    assert [row.period for row in rows] == [1, 3, 1]
+
+
+def test_january_after_december_rolls_into_next_year():
+    rows = parse_schedule("12月20日 授業\n1月8日 授業", 2024)
+
+    assert [row.date for row in rows] == [date(2024, 12, 20), date(2025, 1, 8)]